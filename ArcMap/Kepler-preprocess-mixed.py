@@ -5,43 +5,42 @@ Created on Wed Sep  4 14:30:00 2024
 @author: noamgal
 """
 import pandas as pd
-import geopandas as gpd
 import numpy as np
 from shapely.geometry import Point
 from datetime import datetime, timedelta
+import os
+import sys
 
-# Load data
-zones_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp'
-large_zones_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/33_02.09.2021.shp'
-half_hour_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHalfHour6_20Trips201819_1270_weekday_v1.2.csv'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from TripTables import load_trip_table
+from ZoneRegistry import load_zone_registry
+from ZoneGeometry import load_centroids, load_zones
 
-zones = gpd.read_file(zones_path)
-large_zones = gpd.read_file(large_zones_path)
-trip_data = pd.read_csv(half_hour_path)
+# Load data
+zones = load_zones('TAZ_1270', epsg=3857)
+large_zones = load_zones('TAZ_33', epsg=3857)
+trip_data = load_trip_table('half_hourly')
+registry = load_zone_registry()
 
-# Calculate centroids
-zones = zones.to_crs(epsg=3857)  # Use a projected CRS
-large_zones = large_zones.to_crs(epsg=3857)
-centroids = zones.geometry.centroid.to_crs(epsg=4326)
-large_centroids = large_zones.geometry.centroid.to_crs(epsg=4326)
+# Precomputed centroids, indexed by zone id
+centroids = load_centroids('TAZ_1270', epsg=4326)
+large_centroids = load_centroids('TAZ_33', epsg=4326)
 
 # Create dictionaries of TAZ to centroid coordinates
-taz_to_centroid = {taz: (lat, lon) for taz, (lat, lon) in zip(zones['TAZ_1270'], zip(centroids.y, centroids.x))}
-large_taz_to_centroid = {taz: (lat, lon) for taz, (lat, lon) in zip(large_zones['TAZ_33'], zip(large_centroids.y, large_centroids.x))}
+taz_to_centroid = {taz: (lat, lon) for taz, (lat, lon) in zip(centroids.index, zip(centroids.y, centroids.x))}
+large_taz_to_centroid = {taz: (lat, lon) for taz, (lat, lon) in zip(large_centroids.index, zip(large_centroids.y, large_centroids.x))}
 
-# Create a mapping from TAZ_1270 to TAZ_33
-taz_1270_to_33 = dict(zip(zones['TAZ_1270'], zones['TAZ_33']))
 
 def determine_nearby_zones(focus_zone, zones, large_zones):
     focus_point = Point(taz_to_centroid[focus_zone])
-    focus_large_zone = zones[zones['TAZ_1270'] == focus_zone]['TAZ_33'].iloc[0]
+    focus_large_zone = registry.parent(focus_zone)
     
     # Get neighboring large zones
     neighboring_large_zones = large_zones[large_zones.touches(large_zones[large_zones['TAZ_33'] == focus_large_zone].geometry.iloc[0])]['TAZ_33'].tolist()
     neighboring_large_zones.append(focus_large_zone)
     
     # Get all small zones within these large zones
-    nearby_zones = zones[zones['TAZ_33'].isin(neighboring_large_zones)]['TAZ_1270'].tolist()
+    nearby_zones = registry.taz[np.isin(registry.taz_33, neighboring_large_zones)].tolist()
     
     return set(nearby_zones)
 
@@ -67,13 +66,13 @@ def create_kepler_data(trip_data, focus_zone, direction='to', min_trips=0.5):
         if from_zone in nearby_zones:
             from_lat, from_lon = taz_to_centroid[from_zone]
         else:
-            large_zone = taz_1270_to_33[from_zone]
+            large_zone = registry.parent(from_zone)
             from_lat, from_lon = large_taz_to_centroid[large_zone]
         
         if to_zone in nearby_zones:
             to_lat, to_lon = taz_to_centroid[to_zone]
         else:
-            large_zone = taz_1270_to_33[to_zone]
+            large_zone = registry.parent(to_zone)
             to_lat, to_lon = large_taz_to_centroid[large_zone]
         
         for hour in range(6, 20):
@@ -8,31 +8,27 @@ Created on Mon Sep  2 10:40:34 2024
 
 
 import pandas as pd
-import geopandas as gpd
-import pyproj
 from datetime import datetime, timedelta
+import os
+import sys
 
-# Load data
-zones_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp'
-half_hour_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHalfHour6_20Trips201819_1270_weekday_v1.2.csv'
-hourly_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_v1.csv'
-hourly_arrival_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_arrival_v1.2.csv'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from TripTables import load_trip_table
+from ZoneRegistry import load_zone_registry
 
-zones = gpd.read_file(zones_path)
-half_hour_data = pd.read_csv(half_hour_path)
-hourly_data = pd.read_csv(hourly_path)
-hourly_arrival_data = pd.read_csv(hourly_arrival_path)
+# Load data
+registry = load_zone_registry()
+half_hour_data = load_trip_table('half_hourly')
+hourly_data = load_trip_table('hourly')
+hourly_arrival_data = load_trip_table('hourly_arrival')
 
 print('Datasets loaded')
 
-# Calculate centroids
-israel_tm_crs = pyproj.CRS.from_epsg(2039)  # Israel TM Grid
-zones_tm = zones.to_crs(israel_tm_crs)
-centroids_tm = zones_tm.geometry.centroid
-centroids = centroids_tm.to_crs(epsg=4326)
+# Centroids computed in Israel TM Grid (EPSG:2039), as lon/lat
+centroid_lon, centroid_lat = registry.centroids[4326].T
 
 # Create a dictionary of TAZ to centroid coordinates
-taz_to_centroid = {taz: (lat, lon) for taz, (lat, lon) in zip(zones['TAZ_1270'], zip(centroids.y, centroids.x))}
+taz_to_centroid = {taz: (lat, lon) for taz, lat, lon in zip(registry.taz.tolist(), centroid_lat, centroid_lon)}
 
 def create_kepler_data(trip_data, focus_zone, direction='to', time_interval='hourly', min_trips=0.5, offset=0.0005):
     kepler_data = []
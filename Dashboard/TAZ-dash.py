@@ -5,23 +5,30 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import pandas as pd
-import geopandas as gpd
 import numpy as np
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from ZoneRegistry import load_zone_registry
+from ODTensor import load_od_tensor
+from ZoneGeometry import load_zones
 
 print("Loading data...")
 # Load data
-df_weekday = pd.read_csv('/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_v1.csv')
-df_weekday_arrival = pd.read_csv('/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_arrival_v1.2.csv')
-zones = gpd.read_file('/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp')
+# Zone x zone x hour arrays: trips to or from a zone are a single slice
+od_weekday = load_od_tensor('hourly')
+od_weekday_arrival = load_od_tensor('hourly_arrival')
 population_df = pd.read_excel('/Users/noamgal/Downloads/NUR/celular1819_v1.3/1270_population.xlsx')
 
-# Convert zones to Web Mercator projection
-zones = zones.to_crs(epsg=3857)
+# Zones in Web Mercator with precomputed centroids, and simplified in WGS84 for the map
+zones = load_zones('TAZ_1270', epsg=3857).copy()
+map_zones = load_zones('TAZ_1270', epsg=4326, tolerance=10)
 
-# Preprocessing to filter out problematic TAZs
-valid_tazs = df_weekday['ToZone'].unique()
-valid_tazs = [taz for taz in valid_tazs if taz in zones['TAZ_1270'].values]
-valid_tazs = [taz for taz in valid_tazs if taz in population_df['TAZ_1270'].values]
+# Preprocessing to filter out problematic TAZs: destination zones that are
+# in the shapefile and the population table, sorted by zone id
+registry = load_zone_registry()
+valid_tazs = registry.valid_zones().tolist()
 
 print("Data loaded successfully")
 
@@ -52,14 +59,10 @@ app.layout = html.Div([
     html.Div(id='output-message', style={'textAlign': 'center', 'color': '#FFFFFF', 'fontFamily': 'Roboto', 'fontSize': '27px', 'marginTop': '20px'})
 ], style={'backgroundColor': '#1E1E1E', 'minHeight': '100vh', 'padding': '20px'})
 
-def plot_time_signature(df_weekday, df_weekday_arrival, focus_zone):
+def plot_time_signature(od_weekday, od_weekday_arrival, focus_zone):
     print(f"Plotting time signature for focus zone: {focus_zone}")
-    to_focus = df_weekday_arrival[df_weekday_arrival['ToZone'] == focus_zone]
-    from_focus = df_weekday[df_weekday['fromZone'] == focus_zone]
-
-    time_columns = [f'h{i}' for i in range(24)]
-    arrivals = to_focus[time_columns].sum()
-    departures = from_focus[time_columns].sum()
+    arrivals = od_weekday_arrival.profile_to(focus_zone)
+    departures = od_weekday.profile_from(focus_zone)
 
     arrivals_percent = (arrivals / arrivals.sum()) * 100
     departures_percent = (departures / departures.sum()) * 100
@@ -101,11 +104,11 @@ def plot_trips_by_distance(focus_zone):
     print(f"Plotting trips by distance for focus zone: {focus_zone}")
 
     # Calculate distances
-    focus_point = zones[zones['TAZ_1270'] == focus_zone].geometry.centroid.iloc[0]
-    zones['distance'] = zones.geometry.centroid.distance(focus_point) / 1000  # Convert to km
+    focus_x, focus_y = zones.loc[zones['TAZ_1270'] == focus_zone, ['centroid_x', 'centroid_y']].iloc[0]
+    zones['distance'] = np.hypot(zones['centroid_x'] - focus_x, zones['centroid_y'] - focus_y) / 1000  # Convert to km
 
     # Get trips data
-    trips_to_focus = df_weekday[df_weekday['ToZone'] == focus_zone].groupby('fromZone')[['h' + str(i) for i in range(24)]].sum().sum(axis=1)
+    trips_to_focus = od_weekday.totals_to(focus_zone)
 
     # Merge trips and distance data
     trips_with_distance = zones.merge(trips_to_focus.reset_index(), left_on='TAZ_1270', right_on='fromZone', how='right')
@@ -169,7 +172,7 @@ def create_geopandas_map(focus_zone):
     print(f"Creating geopandas map for focus zone: {focus_zone}")
 
     # Calculate trips to focus zone
-    trips_to_focus = df_weekday[df_weekday['ToZone'] == focus_zone].groupby('fromZone')[['h' + str(i) for i in range(24)]].sum().sum(axis=1)
+    trips_to_focus = od_weekday.totals_to(focus_zone)
 
     # Prepare population data
     population = population_df.set_index('TAZ_1270')[2019]
@@ -188,13 +191,13 @@ def create_geopandas_map(focus_zone):
     })
 
     # Merge with zones
-    zones_data = zones.merge(mapping_data, on='TAZ_1270', how='left')
+    zones_data = map_zones.merge(mapping_data, on='TAZ_1270', how='left')
     zones_data['trips_per_10k'] = zones_data['trips_per_10k'].fillna(0)
     zones_data['total_trips'] = zones_data['total_trips'].fillna(0)
 
     # Calculate total arrivals and departures for focus zone
-    total_arrivals = df_weekday_arrival[df_weekday_arrival['ToZone'] == focus_zone][['h' + str(i) for i in range(24)]].sum().sum()
-    total_departures = df_weekday[df_weekday['fromZone'] == focus_zone][['h' + str(i) for i in range(24)]].sum().sum()
+    total_arrivals = od_weekday_arrival.profile_to(focus_zone).sum()
+    total_departures = od_weekday.profile_from(focus_zone).sum()
 
     # Set up color map
     vmin = 10  # Minimum value for coloring (less than this will be transparent)
@@ -210,9 +213,6 @@ def create_geopandas_map(focus_zone):
         [1, 'rgba(25,25,112,0.6)']  # Dark blue
     ]
 
-    # Convert to WGS84 for Plotly
-    zones_data = zones_data.to_crs(epsg=4326)
-
     # Get focus zone geometry and calculate bounding box
     focus_zone_geo = zones_data[zones_data['TAZ_1270'] == focus_zone]
     bbox = focus_zone_geo.total_bounds
@@ -361,7 +361,7 @@ def update_graphs(selected_taz, clickData, current_taz):
     print(f"Updating graphs for TAZ: {taz}")
     try:
         geopandas_map = create_geopandas_map(taz)
-        time_signature_fig = plot_time_signature(df_weekday, df_weekday_arrival, taz)
+        time_signature_fig = plot_time_signature(od_weekday, od_weekday_arrival, taz)
         trips_by_distance_fig = plot_trips_by_distance(taz)
 
         message = f"All graphs updated successfully for TAZ {taz}."
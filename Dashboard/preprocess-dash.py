@@ -2,12 +2,17 @@ import pandas as pd
 import geopandas as gpd
 import numpy as np
 from tqdm import tqdm
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from TripTables import load_trip_table
 
 print("Loading data...")
 zones = gpd.read_file('/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp').to_crs(epsg=3857)
 population_df = pd.read_excel('/Users/noamgal/Downloads/NUR/celular1819_v1.3/1270_population.xlsx')
-df_weekday = pd.read_csv('/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_v1.csv')
-df_weekday_arrival = pd.read_csv('/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_arrival_v1.2.csv')
+df_weekday = load_trip_table('hourly')
+df_weekday_arrival = load_trip_table('hourly_arrival')
 
 print("Preprocessing data...")
 print("Step 1/5: Preparing population data")
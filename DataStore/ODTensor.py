@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trip tables as dense zone x zone x time slot arrays.
+
+build_od_tensor writes a trip table (see TripTables.py) as a float32 .npy
+array indexed [origin, destination, slot] by contiguous zone index. The
+hourly tables give 1270 x 1270 x 24 and the half-hourly one 1270 x 1270 x 28.
+The array is saved next to the data with an index file holding the zone ids
+and slot columns. load_od_tensor opens it as a read-only memory map, so the
+OS page cache shares one copy between processes and only the slices a
+script reads are loaded. "All trips to zone Z" is od.to_zone(Z), one slice,
+instead of a boolean mask over the long table.
+
+Build all three once:
+    python ODTensor.py --data-dir /path/to/celular1819_v1.3
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from TripTables import DATA_DIR, TRIP_FILES, load_trip_table, source_stamp, time_columns
+
+
+class ODTensor:
+    """Trips between zones per time slot: data[origin index, destination index, slot]."""
+
+    def __init__(self, data, zones, columns):
+        self.data = data
+        self.zones = np.asarray(zones)
+        self.columns = list(columns)
+        self._index = {taz: i for i, taz in enumerate(self.zones.tolist())}
+
+    def __repr__(self):
+        return f"ODTensor({len(self.zones)} zones x {len(self.columns)} slots)"
+
+    def index(self, taz):
+        """Contiguous index of a zone id."""
+        return self._index[taz]
+
+    def to_zone(self, taz):
+        """(zones, slots) trips from every zone to taz."""
+        return self.data[:, self._index[taz], :]
+
+    def from_zone(self, taz):
+        """(zones, slots) trips from taz to every zone."""
+        return self.data[self._index[taz]]
+
+    def profile_to(self, taz):
+        """Trips to taz per slot, summed over origins."""
+        return self.to_zone(taz).sum(axis=0)
+
+    def profile_from(self, taz):
+        """Trips from taz per slot, summed over destinations."""
+        return self.from_zone(taz).sum(axis=0)
+
+    def totals_to(self, taz):
+        """
+        Daily trips to taz per origin, over every zone including those with no
+        trips (like groupby('fromZone')[slots].sum().sum(axis=1) on a table
+        listing every zone pair).
+        """
+        return pd.Series(self.to_zone(taz).sum(axis=1), index=pd.Index(self.zones, name='fromZone'))
+
+    def totals_from(self, taz):
+        """Daily trips from taz per destination, over every zone including those with no trips."""
+        return pd.Series(self.from_zone(taz).sum(axis=1), index=pd.Index(self.zones, name='ToZone'))
+
+
+def tensor_paths(name, cache_dir):
+    return os.path.join(cache_dir, f"od_{name}.npy"), os.path.join(cache_dir, f"od_{name}_index.npz")
+
+
+def build_od_tensor(table, path, zones=None):
+    """
+    Write a trip table as a float32 (zones, zones, slots) .npy array at path; return (zones, columns).
+
+    zones fixes the zone order (rows of the table with other zones are
+    dropped); by default it is every zone id in the table, sorted.
+    """
+    columns = time_columns(table.columns)
+    if zones is None:
+        zones = np.union1d(table['fromZone'].unique(), table['ToZone'].unique())
+    zones = np.asarray(zones)
+
+    zone_index = pd.Index(zones)
+    origin = zone_index.get_indexer(table['fromZone'])
+    destination = zone_index.get_indexer(table['ToZone'])
+    keep = (origin >= 0) & (destination >= 0)
+    # A pair may appear on several rows; add them up
+    flows = pd.DataFrame(table.loc[keep, columns].to_numpy(np.float32), columns=columns)
+    flows['cell'] = origin[keep].astype(np.int64) * len(zones) + destination[keep]
+    flows = flows.groupby('cell').sum()
+    cells = flows.index.to_numpy()
+
+    # Write to a temporary file first, so readers never map a half-written array
+    temp_path = path + '.tmp'
+    data = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float32,
+                                     shape=(len(zones), len(zones), len(columns)))
+    data[cells // len(zones), cells % len(zones)] = flows[columns].to_numpy(np.float32)
+    data.flush()
+    del data
+    os.replace(temp_path, path)
+    return zones, columns
+
+
+def load_od_tensor(name, data_dir=DATA_DIR, cache_dir=None, zones=None):
+    """
+    Memory-map the OD tensor of a trip table (a key of TRIP_FILES), building it if needed.
+
+    The tensor is rebuilt when its trip CSV changes or a different zone order is requested.
+    """
+    cache_dir = cache_dir or data_dir
+    path, index_path = tensor_paths(name, cache_dir)
+    stamp = source_stamp(os.path.join(data_dir, TRIP_FILES[name]))
+
+    if os.path.exists(path) and os.path.exists(index_path):
+        index = np.load(index_path)
+        if str(index['source']) == stamp and (zones is None or np.array_equal(index['zones'], zones)):
+            return ODTensor(np.load(path, mmap_mode='r'), index['zones'], index['columns'])
+        print(f"Trip table or zones changed, rebuilding {path}")
+
+    started = time.perf_counter()
+    zones, columns = build_od_tensor(load_trip_table(name, data_dir), path, zones)
+    np.savez(index_path, zones=zones, columns=np.array(columns), source=stamp)
+    tensor = ODTensor(np.load(path, mmap_mode='r'), zones, columns)
+    print(f"Built {tensor} at {path} in {time.perf_counter() - started:.1f} s")
+    return tensor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build memory-mappable OD tensors from the cellular trip tables.")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-dir', help="where to write the tensors (default: the data directory)")
+    args = parser.parse_args()
+
+    for name in TRIP_FILES:
+        print(load_od_tensor(name, args.data_dir, args.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
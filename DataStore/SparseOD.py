@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sparse OD matrices over the zone pairs that have trips.
+
+Most of the 1270 x 1270 zone pairs have no trips, so SparseOD keeps only the
+pairs that do. The daily total is a scipy CSR matrix, and the per-slot
+layers share its sparsity pattern as one (pairs, slots) float32 array. A CSC
+ordering of the same pairs is precomputed, so the trips from a zone (a row)
+and to a zone (a column) are both read in O(pairs of that zone), for the
+daily total or for one slot. Row and column sums and top-K lookups follow
+from those, with memory proportional to the flows that exist.
+
+The matrices are cached as od_<table>_sparse.npz next to the data:
+    python SparseOD.py --data-dir /path/to/celular1819_v1.3
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from TripTables import DATA_DIR, TRIP_FILES, load_trip_table, source_stamp, time_columns
+
+
+class SparseOD:
+    """
+    Trips between zones for the zone pairs with trips.
+
+    total is the (zones, zones) CSR matrix of daily trips; values[p, s] is the
+    trips of pair p (in CSR order) in slot s. csc_indptr, csc_origin and
+    csc_pair list the same pairs by destination.
+    """
+
+    def __init__(self, zones, columns, indptr, destination, values, csc_indptr, csc_origin, csc_pair):
+        self.zones = np.asarray(zones)
+        self.columns = list(columns)
+        self.indptr = indptr
+        self.destination = destination
+        self.values = values
+        self.csc_indptr = csc_indptr
+        self.csc_origin = csc_origin
+        self.csc_pair = csc_pair
+        n = len(self.zones)
+        self.total = csr_matrix((values.sum(axis=1, dtype=np.float32), destination, indptr), shape=(n, n))
+        self._index = {taz: i for i, taz in enumerate(self.zones.tolist())}
+
+    def __repr__(self):
+        return f"SparseOD({len(self.zones)} zones, {len(self.destination)} pairs x {len(self.columns)} slots)"
+
+    def index(self, taz):
+        return self._index[taz]
+
+    def _slot_values(self, pairs, slot):
+        if slot is None:
+            return self.total.data[pairs]
+        return self.values[pairs, self.columns.index(slot) if isinstance(slot, str) else slot]
+
+    def row(self, taz, slot=None):
+        """(destination zone ids, trips) from taz, daily or for one slot (index or column name)."""
+        i = self._index[taz]
+        pairs = np.arange(self.indptr[i], self.indptr[i + 1])
+        return self.zones[self.destination[pairs]], self._slot_values(pairs, slot)
+
+    def column(self, taz, slot=None):
+        """(origin zone ids, trips) to taz, daily or for one slot."""
+        j = self._index[taz]
+        rows = slice(self.csc_indptr[j], self.csc_indptr[j + 1])
+        return self.zones[self.csc_origin[rows]], self._slot_values(self.csc_pair[rows], slot)
+
+    def origin_totals(self):
+        """Daily trips leaving each zone (row sums), in zone order."""
+        return np.asarray(self.total.sum(axis=1)).ravel()
+
+    def destination_totals(self):
+        """Daily trips arriving in each zone (column sums), in zone order."""
+        return np.asarray(self.total.sum(axis=0)).ravel()
+
+    def top_destinations(self, taz, k=None, slot=None):
+        """The k destinations with the most trips from taz (all if k is None), largest first."""
+        zones, trips = self.row(taz, slot)
+        return top(zones, trips, k, 'ToZone')
+
+    def top_origins(self, taz, k=None, slot=None):
+        """The k origins with the most trips to taz (all if k is None), largest first."""
+        zones, trips = self.column(taz, slot)
+        return top(zones, trips, k, 'fromZone')
+
+    def save(self, path, source):
+        np.savez(path, zones=self.zones, columns=np.array(self.columns), indptr=self.indptr,
+                 destination=self.destination, values=self.values, csc_indptr=self.csc_indptr,
+                 csc_origin=self.csc_origin, csc_pair=self.csc_pair, source=source)
+
+    @classmethod
+    def load(cls, cached):
+        return cls(cached['zones'], cached['columns'], cached['indptr'], cached['destination'], cached['values'],
+                   cached['csc_indptr'], cached['csc_origin'], cached['csc_pair'])
+
+
+def top(zones, trips, k, name):
+    order = np.argsort(trips, kind='stable')[::-1]
+    if k is not None:
+        order = order[:k]
+    return pd.Series(trips[order], index=pd.Index(zones[order], name=name))
+
+
+def build_sparse_od(table, zones=None):
+    """Build a SparseOD from a trip table, keeping the zone pairs with trips."""
+    columns = time_columns(table.columns)
+    if zones is None:
+        zones = np.union1d(table['fromZone'].unique(), table['ToZone'].unique())
+    zones = np.asarray(zones)
+    n = len(zones)
+
+    zone_index = pd.Index(zones)
+    origin = zone_index.get_indexer(table['fromZone'])
+    destination = zone_index.get_indexer(table['ToZone'])
+    keep = (origin >= 0) & (destination >= 0)
+    # Sorting by cell gives CSR order; a pair on several rows is added up
+    flows = pd.DataFrame(table.loc[keep, columns].to_numpy(np.float32), columns=columns)
+    flows['cell'] = origin[keep].astype(np.int64) * n + destination[keep]
+    flows = flows.groupby('cell').sum()
+    values = flows[columns].to_numpy(np.float32)
+    nonzero = values.any(axis=1)
+    cells, values = flows.index.to_numpy()[nonzero], values[nonzero]
+
+    origin, destination = cells // n, (cells % n).astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origin, minlength=n), out=indptr[1:])
+
+    csc_pair = np.lexsort((origin, destination))
+    csc_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(destination, minlength=n), out=csc_indptr[1:])
+    return SparseOD(zones, columns, indptr, destination, values, csc_indptr,
+                    origin[csc_pair].astype(np.int32), csc_pair)
+
+
+def load_sparse_od(name, data_dir=DATA_DIR, cache_dir=None, zones=None):
+    """Load the cached SparseOD of a trip table (a key of TRIP_FILES), building it if needed."""
+    path = os.path.join(cache_dir or data_dir, f"od_{name}_sparse.npz")
+    stamp = source_stamp(os.path.join(data_dir, TRIP_FILES[name]))
+
+    if os.path.exists(path):
+        cached = np.load(path)
+        if str(cached['source']) == stamp and (zones is None or np.array_equal(cached['zones'], zones)):
+            return SparseOD.load(cached)
+        print(f"Trip table or zones changed, rebuilding {path}")
+
+    started = time.perf_counter()
+    od = build_sparse_od(load_trip_table(name, data_dir), zones)
+    od.save(path, stamp)
+    print(f"Built {od} at {path} in {time.perf_counter() - started:.1f} s")
+    return od
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build sparse OD matrices from the cellular trip tables.")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-dir', help="where to write the matrices (default: the data directory)")
+    args = parser.parse_args()
+
+    for name in TRIP_FILES:
+        print(load_sparse_od(name, args.data_dir, args.cache_dir))
+
+
+if __name__ == "__main__":
+    main()
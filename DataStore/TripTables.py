@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar copies of the cellular trip tables.
+
+The trip CSVs are several hundred MB of text that every analysis script used
+to parse from scratch into int64/float64 columns. convert_trip_table parses
+a CSV once with pyarrow, stores the zone ids as the smallest integer type
+that holds them (int16 or int32) and the time columns (h0..h23, h600..h1930)
+as float32, and writes an uncompressed Feather file next to it.
+load_trip_table memory-maps that file, so later loads take seconds and the
+OS page cache shares one copy between processes. A Feather file is rebuilt
+when the size or modification time of its CSV changes.
+
+Convert all three tables once:
+    python TripTables.py --data-dir /path/to/celular1819_v1.3
+
+and load them in a script with:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+    from TripTables import load_trip_table
+    df_weekday = load_trip_table('hourly')
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute
+import pyarrow.csv
+import pyarrow.feather
+
+DATA_DIR = '/Users/noamgal/Downloads/NUR/celular1819_v1.3'
+
+TRIP_FILES = {
+    'hourly': 'AvgDayHourlyTrips201819_1270_weekday_v1.csv',
+    'hourly_arrival': 'AvgDayHourlyTrips201819_1270_weekday_arrival_v1.2.csv',
+    'half_hourly': 'AvgDayHalfHour6_20Trips201819_1270_weekday_v1.2.csv',
+}
+
+ZONE_COLUMNS = ['fromZone', 'ToZone']
+
+# h0..h23 in the hourly tables, h600..h1930 in the half-hourly one
+TIME_COLUMN = re.compile(r'^h\d+$')
+
+
+def time_columns(columns):
+    """The trip count columns among columns, in file order."""
+    return [column for column in columns if TIME_COLUMN.match(column)]
+
+
+def smallest_int_type(values):
+    """int16 if every value fits, else int32 (int64 only if needed)."""
+    low, high = (pa.compute.min(values).as_py(), pa.compute.max(values).as_py()) if len(values) else (0, 0)
+    for dtype, arrow_type in ((np.int16, pa.int16()), (np.int32, pa.int32())):
+        info = np.iinfo(dtype)
+        if low is not None and info.min <= low and high <= info.max:
+            return arrow_type
+    return pa.int64()
+
+
+def source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return f"{os.path.basename(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def feather_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.feather'
+
+
+def convert_trip_table(csv_path, output_path=None):
+    """Convert a trip CSV to a compact, uncompressed Feather file; return its path."""
+    output_path = output_path or feather_path(csv_path)
+    started = time.perf_counter()
+    table = pa.csv.read_csv(csv_path)
+
+    fields = []
+    for field in table.schema:
+        if TIME_COLUMN.match(field.name):
+            fields.append(pa.field(field.name, pa.float32()))
+        elif pa.types.is_integer(field.type):
+            fields.append(pa.field(field.name, smallest_int_type(table[field.name])))
+        else:
+            fields.append(field)
+    table = table.cast(pa.schema(fields))
+    table = table.replace_schema_metadata({'source': source_stamp(csv_path)})
+
+    pa.feather.write_feather(table, output_path, compression='uncompressed')
+    print(f"Converted {csv_path} ({table.num_rows} rows) to {output_path} in "
+          f"{time.perf_counter() - started:.1f} s")
+    return output_path
+
+
+def is_current(csv_path, path):
+    """True if the Feather file at path was converted from the CSV as it is now."""
+    if not os.path.exists(path):
+        return False
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(b'source', b'').decode() == source_stamp(csv_path)
+
+
+def load_trip_table(name, data_dir=DATA_DIR, columns=None, copy=False):
+    """
+    Load a trip table as a DataFrame from its memory-mapped Feather copy.
+
+    name is a key of TRIP_FILES or a path to a trip CSV. The Feather file is
+    created on first use and whenever the CSV changes.
+
+    By default the numeric columns are read-only views of the mapped file, so
+    assigning into them in place (df.loc[...] = ...) raises ValueError, unlike
+    a pd.read_csv frame; adding or replacing whole columns works. Pass
+    copy=True to read the table into writable memory instead.
+    """
+    csv_path = os.path.join(data_dir, TRIP_FILES[name]) if name in TRIP_FILES else name
+    path = feather_path(csv_path)
+    if not is_current(csv_path, path):
+        convert_trip_table(csv_path, path)
+    if copy:
+        return pa.feather.read_table(path, columns=columns).to_pandas()
+    # Numeric columns without nulls are views of the mapped file, not copies
+    table = pa.feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the cellular trip CSVs to memory-mappable Feather files.")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--force', action='store_true', help="convert even if the Feather files are current")
+    args = parser.parse_args()
+
+    for filename in TRIP_FILES.values():
+        csv_path = os.path.join(args.data_dir, filename)
+        if args.force or not is_current(csv_path, feather_path(csv_path)):
+            convert_trip_table(csv_path)
+        else:
+            print(f"{feather_path(csv_path)} is up to date")
+
+
+if __name__ == "__main__":
+    main()
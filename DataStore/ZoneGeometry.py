@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GeoParquet cache of the TAZ_1270 and TAZ_33 zone shapes.
+
+Each shapefile is read once and written to geometry_cache/ in the data
+folder as one GeoParquet file per CRS in CACHE_CRS. There are also
+simplified variants at SIMPLIFY_TOLERANCES (metres). These are simplified
+as a coverage in Israel TM, so neighbouring zones keep their shared borders,
+which is enough for choropleth maps. Every file carries centroid_x and
+centroid_y columns, which hold the centroid of the full-resolution zone
+computed in Israel TM and expressed in that file's CRS.
+
+load_zones only reads the variant asked for, and keeps it in memory for
+later calls in the same process. Scripts and dashboard callbacks therefore
+no longer parse shapefiles, reproject or compute centroids. The cache of a
+layer is rebuilt when its shapefile changes.
+
+    python ZoneGeometry.py --data-dir /path/to/celular1819_v1.3
+"""
+
+import argparse
+import json
+import os
+import time
+from functools import lru_cache
+
+from TripTables import DATA_DIR, source_stamp
+
+LAYERS = {
+    'TAZ_1270': os.path.join('Shape_files', '1270_02.09.2021.shp'),
+    'TAZ_33': os.path.join('Shape_files', '33_02.09.2021.shp'),
+}
+
+CACHE_CRS = (2039, 3857, 4326)
+SIMPLIFY_TOLERANCES = (10, 50, 200)
+
+CACHE_DIRNAME = 'geometry_cache'
+
+
+def variant_path(cache_dir, layer, epsg, tolerance=None):
+    suffix = f"_simplified_{tolerance}m" if tolerance else ""
+    return os.path.join(cache_dir, f"{layer}_{epsg}{suffix}.parquet")
+
+
+def simplify_coverage(geometry, tolerance):
+    """Simplify polygons that tile an area without opening gaps between them."""
+    import shapely
+
+    if hasattr(shapely, 'coverage_simplify'):
+        return shapely.coverage_simplify(geometry, tolerance)
+    # Older shapely: each polygon is simplified on its own, so shared borders may drift apart
+    return shapely.simplify(geometry, tolerance, preserve_topology=True)
+
+
+def build_geometry_cache(layer, data_dir=DATA_DIR, cache_dir=None):
+    """Write every CRS and simplified variant of a layer's shapefile to the cache."""
+    import geopandas as gpd
+
+    cache_dir = cache_dir or os.path.join(data_dir, CACHE_DIRNAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    zones = gpd.read_file(os.path.join(data_dir, LAYERS[layer])).to_crs(epsg=2039)
+    centroids = zones.geometry.centroid
+    variants = {None: zones}
+    for tolerance in SIMPLIFY_TOLERANCES:
+        simplified = zones.copy()
+        simplified.geometry = gpd.GeoSeries(simplify_coverage(zones.geometry.values, tolerance),
+                                            index=zones.index, crs=zones.crs)
+        variants[tolerance] = simplified
+
+    for epsg in CACHE_CRS:
+        points = centroids.to_crs(epsg=epsg)
+        for tolerance, variant in variants.items():
+            variant = variant.to_crs(epsg=epsg)
+            variant['centroid_x'] = points.x
+            variant['centroid_y'] = points.y
+            variant.to_parquet(variant_path(cache_dir, layer, epsg, tolerance))
+
+    manifest_path = os.path.join(cache_dir, 'sources.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    manifest[layer] = source_stamp(os.path.join(data_dir, LAYERS[layer]))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Cached {layer} in {len(CACHE_CRS)} CRS x {len(variants)} variants in {cache_dir} in "
+          f"{time.perf_counter() - started:.1f} s")
+
+
+def is_current(layer, data_dir, cache_dir):
+    manifest_path = os.path.join(cache_dir, 'sources.json')
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest.get(layer) == source_stamp(os.path.join(data_dir, LAYERS[layer]))
+
+
+@lru_cache(maxsize=None)
+def load_zones(layer='TAZ_1270', epsg=3857, tolerance=None, data_dir=DATA_DIR, cache_dir=None):
+    """
+    Zones of a layer in a CRS of CACHE_CRS, simplified to tolerance metres
+    (one of SIMPLIFY_TOLERANCES) or at full resolution if None.
+
+    The GeoDataFrame is shared between calls in a process; copy it before
+    changing it in place.
+    """
+    import geopandas as gpd
+
+    cache_dir = cache_dir or os.path.join(data_dir, CACHE_DIRNAME)
+    if not is_current(layer, data_dir, cache_dir):
+        build_geometry_cache(layer, data_dir, cache_dir)
+    return gpd.read_parquet(variant_path(cache_dir, layer, epsg, tolerance))
+
+
+def load_centroids(layer='TAZ_1270', epsg=3857, data_dir=DATA_DIR, cache_dir=None):
+    """Zone centroids as a point GeoSeries indexed by zone id."""
+    import geopandas as gpd
+
+    zones = load_zones(layer, epsg, SIMPLIFY_TOLERANCES[-1], data_dir, cache_dir)
+    return gpd.GeoSeries(gpd.points_from_xy(zones['centroid_x'], zones['centroid_y']),
+                         index=zones[layer].to_numpy(), crs=zones.crs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache the zone shapefiles as GeoParquet per CRS.")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-dir', help=f"default: {CACHE_DIRNAME}/ in the data directory")
+    args = parser.parse_args()
+
+    for layer in LAYERS:
+        build_geometry_cache(layer, args.data_dir, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One lookup table for the TAZ_1270 zones.
+
+The registry covers the TAZ_1270 ids of the zone shapefile, sorted, and
+gives each a contiguous index. Per index it holds:
+
+- the TAZ_33 parent zone
+- the zone centroid, computed in Israel TM (EPSG:2039) and stored in
+  EPSG:2039, 3857 and 4326
+- the 2019 population (NaN if the zone is not in the population table)
+- whether the zone is a destination in the hourly trip table
+
+Lookups by zone id are a dict access, or a searchsorted call for many ids,
+instead of per-script dicts and `taz in zones['TAZ_1270'].values` scans.
+Ids that are not in the shapefile are not in the registry, so looking one up
+raises KeyError. The shapefile part is cached as zone_registry.npz next to
+the data. The population table and the trip table are only read, and cached
+in files of their own, the first time population, in_population,
+is_destination or valid_zones() is used, so scripts that only need
+centroids and parents do not need them. Each cache file is rebuilt when its
+sources change.
+
+    python ZoneRegistry.py --data-dir /path/to/celular1819_v1.3
+"""
+
+import argparse
+import hashlib
+import os
+from functools import cached_property
+
+import numpy as np
+
+from TripTables import DATA_DIR, TRIP_FILES, load_trip_table, source_stamp
+
+ZONES_FILE = os.path.join('Shape_files', '1270_02.09.2021.shp')
+POPULATION_FILE = '1270_population.xlsx'
+POPULATION_YEAR = 2019
+
+CENTROID_CRS = (2039, 3857, 4326)
+
+
+def positions(sorted_taz, taz):
+    """Positions of the ids taz in the sorted array sorted_taz, -1 where missing."""
+    taz = np.asarray(taz)
+    position = np.searchsorted(sorted_taz, taz).clip(0, max(len(sorted_taz) - 1, 0))
+    return np.where(sorted_taz[position] == taz, position, -1)
+
+
+def cached_arrays(path, sources, build):
+    """The arrays build() returns, cached at path and rebuilt when any of the source files changes."""
+    stamp = hashlib.sha1("\n".join(source_stamp(source) for source in sources).encode()).hexdigest()
+    if os.path.exists(path):
+        cached = np.load(path)
+        if str(cached['source']) == stamp:
+            return {name: cached[name] for name in cached.files if name != 'source'}
+        print(f"Zone data changed, rebuilding {path}")
+
+    arrays = build()
+    np.savez(path, source=stamp, **arrays)
+    print(f"Saved {path}")
+    return arrays
+
+
+class ZoneRegistry:
+    """Per-zone arrays over the sorted TAZ_1270 ids in taz."""
+
+    def __init__(self, taz, taz_33, centroids, data_dir=DATA_DIR, cache_dir=None):
+        self.taz = np.asarray(taz)
+        self.taz_33 = taz_33
+        self.centroids = centroids
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir or data_dir
+        self._index = {taz_id: i for i, taz_id in enumerate(self.taz.tolist())}
+
+    def __repr__(self):
+        return f"ZoneRegistry({len(self.taz)} zones)"
+
+    def __contains__(self, taz):
+        return taz in self._index
+
+    def _sources(self, *filenames):
+        return [os.path.join(self.data_dir, filename) for filename in (ZONES_FILE,) + filenames]
+
+    @cached_property
+    def _population(self):
+        def build():
+            import pandas as pd
+            return population_arrays(self.taz, pd.read_excel(os.path.join(self.data_dir, POPULATION_FILE)))
+        return cached_arrays(os.path.join(self.cache_dir, "zone_registry_population.npz"),
+                             self._sources(POPULATION_FILE), build)
+
+    @property
+    def population(self):
+        """POPULATION_YEAR population per zone, NaN for zones not in the population table."""
+        return self._population['population']
+
+    @property
+    def in_population(self):
+        return self._population['in_population']
+
+    @cached_property
+    def is_destination(self):
+        """Whether each zone is a ToZone of the hourly trip table."""
+        def build():
+            trips = load_trip_table('hourly', self.data_dir, columns=['ToZone'])
+            return destination_arrays(self.taz, trips['ToZone'].unique())
+        return cached_arrays(os.path.join(self.cache_dir, "zone_registry_destinations.npz"),
+                             self._sources(TRIP_FILES['hourly']), build)['is_destination']
+
+    @property
+    def valid(self):
+        """Zones in the population table that are a destination in the trip data."""
+        return self.in_population & self.is_destination
+
+    def valid_zones(self):
+        return self.taz[self.valid]
+
+    def index(self, taz):
+        """Contiguous index of a zone id."""
+        return self._index[taz]
+
+    def indices(self, taz):
+        """Contiguous indices of an array of zone ids, -1 for ids not in the registry."""
+        return positions(self.taz, taz)
+
+    def parent(self, taz):
+        """TAZ_33 zone containing a TAZ_1270 zone."""
+        return int(self.taz_33[self._index[taz]])
+
+    def members(self, taz_33):
+        """TAZ_1270 zones inside a TAZ_33 zone."""
+        return self.taz[self.taz_33 == taz_33]
+
+    def centroid(self, taz, epsg=4326):
+        """(x, y) of a zone's centroid in one of CENTROID_CRS; (lon, lat) for 4326."""
+        x, y = self.centroids[epsg][self._index[taz]]
+        return float(x), float(y)
+
+
+def zone_arrays(zones):
+    """Sorted ids, TAZ_33 parents and centroids of the zone GeoDataFrame (with TAZ_1270 and TAZ_33)."""
+    import geopandas as gpd
+
+    zones = zones.sort_values('TAZ_1270')
+    arrays = {'taz': zones['TAZ_1270'].to_numpy(np.int64), 'taz_33': zones['TAZ_33'].to_numpy(np.int32)}
+    centroid_2039 = zones.to_crs(epsg=2039).geometry.centroid
+    for epsg in CENTROID_CRS:
+        points = gpd.GeoSeries(centroid_2039).to_crs(epsg=epsg)
+        arrays[f"centroid_{epsg}"] = np.column_stack([points.x, points.y])
+    return arrays
+
+
+def population_arrays(taz, population_df):
+    """Population per zone of taz from the population table (TAZ_1270 and a POPULATION_YEAR column)."""
+    position = positions(taz, population_df['TAZ_1270'].to_numpy())
+    found = position >= 0
+    population = np.full(len(taz), np.nan)
+    population[position[found]] = population_df[POPULATION_YEAR].to_numpy(np.float64)[found]
+    in_population = np.zeros(len(taz), dtype=bool)
+    in_population[position[found]] = True
+    return {'population': population, 'in_population': in_population}
+
+
+def destination_arrays(taz, to_zones):
+    """Whether each zone of taz is among the destination zone ids to_zones."""
+    position = positions(taz, to_zones)
+    is_destination = np.zeros(len(taz), dtype=bool)
+    is_destination[position[position >= 0]] = True
+    return {'is_destination': is_destination}
+
+
+def load_zone_registry(data_dir=DATA_DIR, cache_dir=None):
+    """Load the cached zone registry, building it from the zone shapefile if needed."""
+    cache_dir = cache_dir or data_dir
+
+    def build():
+        import geopandas as gpd
+        return zone_arrays(gpd.read_file(os.path.join(data_dir, ZONES_FILE)))
+
+    arrays = cached_arrays(os.path.join(cache_dir, "zone_registry.npz"), [os.path.join(data_dir, ZONES_FILE)], build)
+    centroids = {epsg: arrays[f"centroid_{epsg}"] for epsg in CENTROID_CRS}
+    return ZoneRegistry(arrays['taz'], arrays['taz_33'], centroids, data_dir, cache_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the TAZ_1270 zone registry.")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-dir', help="where to write the zone_registry*.npz files (default: the data directory)")
+    args = parser.parse_args()
+    registry = load_zone_registry(args.data_dir, args.cache_dir)
+    print(f"{registry}, {len(registry.valid_zones())} in the population table and the trip data")
+
+
+if __name__ == "__main__":
+    main()
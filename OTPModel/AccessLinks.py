@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Walk links between TAZ candidate points and GTFS stops.
+
+For every candidate point of every zone (see ZonePoints) the stops within
+walking distance are found once with a KD-tree over stops.txt and stored,
+with the walk in seconds, as compact CSR arrays: link_start[row] ..
+link_start[row + 1] index link_stop and link_walk for row = zone * k + point.
+Transit routers reuse the links for access and egress instead of searching
+from raw coordinates, and coverage() shows how many stops each zone can
+walk to, so a new feed's change in coverage is cheap to check.
+
+Example:
+    python AccessLinks.py --gtfs /path/to/new/gtfs --compare /path/to/old/gtfs
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# Walking speed (m/s, OTP's default) and the longest straight-line walk to or from a stop
+WALK_SPEED = 1.33
+MAX_WALK = 1000
+
+
+def to_metres(lat, lon, lat0):
+    """Project coordinates to a local equirectangular plane in metres (fine at the scale of Israel)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return np.column_stack([lon * 111320 * np.cos(np.radians(lat0)), lat * 110540])
+
+
+def read_stops(gtfs_dir):
+    """stop_id, stop_lat and stop_lon of stops.txt, in file order."""
+    return pd.read_csv(os.path.join(gtfs_dir, 'stops.txt'), usecols=['stop_id', 'stop_lat', 'stop_lon'],
+                       dtype={'stop_id': str})
+
+
+class StopIndex:
+    """KD-tree over stop coordinates, projected to metres around their mean latitude."""
+
+    def __init__(self, stop_lat, stop_lon):
+        self.lat0 = float(np.mean(stop_lat)) if len(stop_lat) else 0.0
+        self.xy = to_metres(stop_lat, stop_lon, self.lat0)
+        self.tree = cKDTree(self.xy)
+
+    def links(self, lat, lon, max_walk=MAX_WALK, walk_speed=WALK_SPEED):
+        """Stops within max_walk of each point as CSR arrays (offsets, stops, walk seconds)."""
+        xy = to_metres(lat, lon, self.lat0)
+        valid = ~np.isnan(xy).any(axis=1)
+        neighbours = np.empty(len(xy), dtype=object)
+        neighbours[:] = [[] for _ in range(len(xy))]
+        if valid.any():
+            neighbours[valid] = self.tree.query_ball_point(xy[valid], max_walk)
+        offsets = np.zeros(len(xy) + 1, dtype=np.int64)
+        np.cumsum([len(n) for n in neighbours], out=offsets[1:])
+        stops = np.fromiter((s for n in neighbours for s in sorted(n)), dtype=np.int32, count=offsets[-1])
+        point = np.repeat(np.arange(len(xy)), np.diff(offsets))
+        walk = (np.linalg.norm(self.xy[stops] - xy[point], axis=1) / walk_speed).astype(np.int32)
+        return offsets, stops, walk
+
+    def pairs(self, max_walk=MAX_WALK, walk_speed=WALK_SPEED):
+        """All ordered pairs of stops within max_walk of each other, as (from, to, walk seconds)."""
+        pairs = self.tree.query_pairs(max_walk, output_type='ndarray')
+        from_stop = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        to_stop = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        walk = np.linalg.norm(self.xy[from_stop] - self.xy[to_stop], axis=1) / walk_speed
+        return from_stop, to_stop, walk.astype(np.int32)
+
+
+class AccessLinks:
+    """Stops within walking distance of each of the K candidate points of every zone."""
+
+    def __init__(self, taz, k, stop_ids, link_start, link_stop, link_walk):
+        self.taz = np.asarray(taz)
+        self.k = k
+        self.stop_ids = np.asarray(stop_ids)
+        self.link_start = link_start
+        self.link_stop = link_stop
+        self.link_walk = link_walk
+        self._row = {taz_id: i for i, taz_id in enumerate(self.taz.tolist())}
+
+    def links(self, taz, point=0):
+        """(stop indices, walk seconds) of one candidate point of a zone."""
+        row = self._row[taz] * self.k + point
+        rows = slice(self.link_start[row], self.link_start[row + 1])
+        return self.link_stop[rows], self.link_walk[rows]
+
+    def point_links(self, point=0):
+        """CSR arrays (offsets, stops, walk seconds) over all zones for one candidate point index."""
+        rows = np.arange(len(self.taz)) * self.k + point
+        counts = self.link_start[rows + 1] - self.link_start[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        positions = np.repeat(self.link_start[rows] - offsets[:-1], counts) + np.arange(offsets[-1])
+        return offsets, self.link_stop[positions], self.link_walk[positions]
+
+    def coverage(self, point=0):
+        """Per zone: number of stops within walking distance of the point and the shortest walk (NaN if none)."""
+        offsets, _, walk = self.point_links(point)
+        counts = np.diff(offsets)
+        nearest = np.full(len(self.taz), np.nan)
+        has_stop = counts > 0
+        nearest[has_stop] = np.minimum.reduceat(walk, offsets[:-1][has_stop]) / 60
+        return pd.DataFrame({'TAZ_1270': self.taz, 'Stops': counts, 'NearestStopWalk': nearest})
+
+    def save(self, path, source_hash):
+        np.savez(path, taz=self.taz, k=self.k, stop_ids=self.stop_ids.astype(str), link_start=self.link_start,
+                 link_stop=self.link_stop, link_walk=self.link_walk, source_hash=source_hash)
+
+    @classmethod
+    def load(cls, cached):
+        return cls(cached['taz'], int(cached['k']), cached['stop_ids'], cached['link_start'],
+                   cached['link_stop'], cached['link_walk'])
+
+
+def build_access_links(stops, zone_points, max_walk=MAX_WALK, walk_speed=WALK_SPEED):
+    """Build AccessLinks from a stops DataFrame (see read_stops) and a ZonePoints table."""
+    index = StopIndex(stops['stop_lat'].to_numpy(), stops['stop_lon'].to_numpy())
+    k = zone_points.lat.shape[1]
+    link_start, link_stop, link_walk = index.links(zone_points.lat.ravel(), zone_points.lon.ravel(),
+                                                   max_walk, walk_speed)
+    return AccessLinks(zone_points.taz, k, stops['stop_id'].to_numpy(), link_start, link_stop, link_walk)
+
+
+def links_hash(gtfs_dir, zone_points, max_walk, walk_speed):
+    """Hash of stops.txt, the candidate points and the walk parameters, to detect stale cached links."""
+    digest = hashlib.sha1()
+    with open(os.path.join(gtfs_dir, 'stops.txt'), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    for array in (zone_points.taz, zone_points.lat, zone_points.lon):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(f"{max_walk}:{walk_speed}".encode())
+    return digest.hexdigest()
+
+
+def load_access_links(gtfs_dir, zone_points, cache_dir, max_walk=MAX_WALK, walk_speed=WALK_SPEED):
+    """Load the cached access links for a feed and zone points, building and caching them if needed."""
+    path = os.path.join(cache_dir, f"access_links_{int(max_walk)}m.npz")
+    source_hash = links_hash(gtfs_dir, zone_points, max_walk, walk_speed)
+
+    if os.path.exists(path):
+        cached = np.load(path)
+        if str(cached['source_hash']) == source_hash:
+            return AccessLinks.load(cached)
+        print(f"Stops or zone points changed, rebuilding {path}")
+
+    links = build_access_links(read_stops(gtfs_dir), zone_points, max_walk, walk_speed)
+    links.save(path, source_hash)
+    print(f"Access links saved to {path}")
+    return links
+
+
+def compare_coverage(old, new, point=0):
+    """Zones whose number of reachable stops differs between two AccessLinks."""
+    merged = old.coverage(point).merge(new.coverage(point), on='TAZ_1270', suffixes=('Before', 'After'))
+    merged['Change'] = merged['StopsAfter'] - merged['StopsBefore']
+    return merged[merged['Change'] != 0].sort_values('Change')
+
+
+def main():
+    from TravelTimes import MAX_ATTEMPTS, OUTPUT_DIR, POINT_SEED, ZONES_PATH
+    import geopandas as gpd
+    from ZonePoints import load_zone_points
+
+    parser = argparse.ArgumentParser(description="Precompute walk links between TAZ points and GTFS stops.")
+    parser.add_argument('--gtfs', required=True, help="GTFS directory cleaned by Clean-Israel-GTFS.py")
+    parser.add_argument('--compare', help="another GTFS directory to compare stop coverage against")
+    parser.add_argument('--zones', default=ZONES_PATH)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--max-walk', type=float, default=MAX_WALK, help="longest walk in metres")
+    args = parser.parse_args()
+
+    zones = gpd.read_file(args.zones).to_crs(epsg=4326)
+    os.makedirs(args.output_dir, exist_ok=True)
+    zone_points = load_zone_points(zones, args.output_dir, MAX_ATTEMPTS, POINT_SEED)
+    links = load_access_links(args.gtfs, zone_points, args.output_dir, args.max_walk)
+
+    coverage = links.coverage()
+    filepath = os.path.join(args.output_dir, "access_coverage.csv")
+    coverage.to_csv(filepath, index=False)
+    print(f"Stop coverage saved to {filepath}: {np.count_nonzero(coverage['Stops'] == 0)} of "
+          f"{len(coverage)} zones have no stop within {args.max_walk:.0f} m")
+
+    if args.compare:
+        old = build_access_links(read_stops(args.compare), zone_points, args.max_walk)
+        changes = compare_coverage(old, links)
+        filepath = os.path.join(args.output_dir, "access_coverage_changes.csv")
+        changes.to_csv(filepath, index=False)
+        print(f"{len(changes)} zones changed stop coverage, saved to {filepath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput and memory benchmark for the GTFS cleaning pipeline.
+
+Generates synthetic MOT-like feeds (see SyntheticGTFS.py) at each scale,
+given in stop_times.txt rows, and times every stage of
+Clean-Israel-GTFS.py on a fresh copy: the translations, routes and stops
+cleaners, a pass of stop_times.txt through the chunked table framework,
+pruning to one service day, and cleaning the zipped feed into a new zip.
+For each stage it reports rows/sec and the peak memory traced by
+tracemalloc. Tracing slows pandas' parsing down about tenfold, so memory is
+measured in a second run of each stage, and the zip stage's worker processes
+are not traced.
+
+Example:
+    python Benchmark-GTFSCleaning.py --scales 10000 1000000 20000000
+"""
+
+import argparse
+import importlib
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from SyntheticGTFS import generate_feed
+
+clean = importlib.import_module('Clean-Israel-GTFS')
+
+
+def count_rows(path):
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f) - 1
+
+
+def stages(feed):
+    """(name, rows processed, function) for every stage, run on the feed directory or zip."""
+    def path(filename):
+        return os.path.join(feed, filename)
+
+    return [
+        ('translations', count_rows(path('translations.txt')),
+         lambda d: clean.update_translations(os.path.join(d, 'translations.txt'))),
+        ('routes', count_rows(path('routes.txt')), lambda d: clean.update_routes(os.path.join(d, 'routes.txt'))),
+        ('stops', count_rows(path('stops.txt')), lambda d: clean.update_stops(os.path.join(d, 'stops.txt'))),
+        ('stop_times pass', count_rows(path('stop_times.txt')),
+         lambda d: clean.rewrite_file(os.path.join(d, 'stop_times.txt'), lambda chunk: chunk)),
+        ('prune one day', count_rows(path('stop_times.txt')),
+         lambda d: clean.prune_gtfs(d, '2024-09-02', '2024-09-02')),
+        ('zip clean', sum(count_rows(path(name)) for name in os.listdir(feed)),
+         lambda d: clean.clean_gtfs_zip(f"{d}.zip", f"{d}-clean.zip")),
+    ]
+
+
+def fresh_copy(feed, work_dir):
+    """Copy the feed and its zip to work_dir/feed, dropping earlier outputs so nothing is skipped as clean."""
+    copy = os.path.join(work_dir, 'feed')
+    shutil.rmtree(copy, ignore_errors=True)
+    for name in os.listdir(work_dir):
+        if name.startswith('feed'):
+            os.remove(os.path.join(work_dir, name))
+    shutil.copytree(feed, copy)
+    shutil.copy(f"{feed}.zip", f"{copy}.zip")
+    return copy
+
+
+def run_stage(feed, function, work_dir, memory=True):
+    """Run one stage on fresh copies of the feed; return (seconds, peak traced bytes or NaN)."""
+    copy = fresh_copy(feed, work_dir)
+    started = time.perf_counter()
+    function(copy)
+    seconds = time.perf_counter() - started
+    if not memory:
+        return seconds, float('nan')
+
+    copy = fresh_copy(feed, work_dir)
+    tracemalloc.start()
+    function(copy)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GTFS cleaning stages on synthetic feeds.")
+    parser.add_argument('--scales', nargs='+', type=int, default=[10_000, 1_000_000],
+                        help="stop_times.txt rows of each synthetic feed")
+    parser.add_argument('--work-dir', help="directory for the generated feeds (default: a temporary one)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced run that measures peak memory")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='gtfs-benchmark-')
+    results = []
+    try:
+        for scale in args.scales:
+            feed = os.path.join(work_dir, f"synthetic-{scale}")
+            started = time.perf_counter()
+            generate_feed(feed, scale)
+            shutil.make_archive(feed, 'zip', feed)
+            print(f"Generated {scale:,} stop_times rows in {time.perf_counter() - started:.1f} s")
+
+            for name, rows, function in stages(feed):
+                seconds, peak = run_stage(feed, function, work_dir, not args.no_memory)
+                results.append((scale, name, rows, seconds, peak))
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'scale':>12} {'stage':<16} {'rows':>12} {'seconds':>9} {'rows/s':>12} {'peak MB':>9}")
+    for scale, name, rows, seconds, peak in results:
+        print(f"{scale:>12,} {name:<16} {rows:>12,} {seconds:>9.2f} {rows / seconds:>12,.0f} {peak / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
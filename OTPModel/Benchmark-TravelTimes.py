@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark for the OTP travel-time pipeline.
+
+Runs one focus-zone sweep over all zones (the same query_zones call that
+TravelTimes.py makes) against MockOTPServer, or against a real OTP with
+--url, and reports requests/sec, plans/sec, request latency percentiles and
+total wall time. Without --zones it uses a synthetic grid of 1,270 zones
+over Israel, so no shapefile or OTP graph is needed.
+
+Example:
+    python Benchmark-TravelTimes.py --max-in-flight 16 --batch-size 25 --latency 0.05
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import box
+
+import MockOTPServer
+from OTPClient import BATCH_SIZE, OTPQueryEngine
+from TravelTimeMetrics import RunMetrics
+from RequestPolicy import OK, NO_ROUTE
+from TravelTimes import MAX_IN_FLIGHT, query_zones
+from ZonePoints import build_zone_points
+
+
+def synthetic_zones(count=1270, size=0.02):
+    """Square zones on a regular grid over Israel's extent, in EPSG:4326."""
+    columns = int(np.ceil(np.sqrt(count)))
+    lons = np.linspace(34.3, 35.7, columns)
+    lats = np.linspace(29.6, 33.2, columns)
+    cells = [(lon, lat) for lat in lats for lon in lons][:count]
+    return gpd.GeoDataFrame({'TAZ_1270': np.arange(100001, 100001 + count)},
+                            geometry=[box(lon, lat, lon + size, lat + size) for lon, lat in cells],
+                            crs=4326)
+
+
+def run_benchmark(zones, url, mode, direction, max_in_flight, batch_size, focus_zone=None, log_path=None):
+    zone_points = build_zone_points(zones)
+    zone_ids = zones['TAZ_1270'].to_numpy()
+    focus_zone = zone_ids[len(zone_ids) // 2] if focus_zone is None else focus_zone
+    focus_lat, focus_lon = zone_points.first(focus_zone)
+    departure_time = datetime.now().replace(hour=7, minute=30, second=0, microsecond=0)
+
+    valid = 0
+    started = time.perf_counter()
+    with RunMetrics(log_path) as metrics, \
+            OTPQueryEngine(url, max_in_flight=max_in_flight, batch_size=batch_size, metrics=metrics) as engine:
+        for _, travel_time, _ in query_zones(engine, zone_points, zone_ids, focus_lat, focus_lon,
+                                             mode, direction, departure_time):
+            valid += travel_time is not None
+        wall_time = time.perf_counter() - started
+        summary = metrics.summary()
+
+    latency = summary['latency'].get(f"{mode} {direction}", {})
+    failed = sum(count for outcome, count in summary['outcomes'].items() if outcome not in (OK, NO_ROUTE))
+    return {
+        'zones': len(zone_ids),
+        'valid_zones': valid,
+        'requests': summary['requests'],
+        'plans': summary['plans'],
+        'failed_plans': failed,
+        'wall_time_s': wall_time,
+        'requests_per_s': summary['requests'] / wall_time,
+        'plans_per_s': summary['plans'] / wall_time,
+        'mean_concurrency': summary['mean_concurrency'],
+        'max_in_flight': max_in_flight,
+        'p50_ms': latency.get('p50_ms', np.nan),
+        'p95_ms': latency.get('p95_ms', np.nan),
+        'p99_ms': latency.get('p99_ms', np.nan),
+    }
+
+
+def print_report(result):
+    print(f"Zones:            {result['valid_zones']}/{result['zones']} with a travel time")
+    print(f"Requests:         {result['requests']} ({result['plans']} plans, {result['failed_plans']} failed)")
+    print(f"Wall time:        {result['wall_time_s']:.2f} s")
+    print(f"Throughput:       {result['requests_per_s']:.1f} requests/s, {result['plans_per_s']:.1f} plans/s")
+    print(f"Request latency:  p50 <= {result['p50_ms']:.0f} ms, p95 <= {result['p95_ms']:.0f} ms, "
+          f"p99 <= {result['p99_ms']:.0f} ms")
+    print(f"In flight:        {result['mean_concurrency']:.1f} of {result['max_in_flight']} on average")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a 1,270-zone travel time sweep.")
+    parser.add_argument('--url', nargs='+', help="OTP endpoint(s) to benchmark instead of a local mock server")
+    parser.add_argument('--zones', help="TAZ shapefile to use instead of the synthetic grid")
+    parser.add_argument('--zone-count', type=int, default=1270, help="number of synthetic zones")
+    parser.add_argument('--focus-zone', type=int)
+    parser.add_argument('--mode', default='TRANSIT', choices=['AUTO', 'TRANSIT'])
+    parser.add_argument('--direction', default='to', choices=['to', 'from'])
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--log', help="append every request to this JSON-lines file")
+    MockOTPServer.add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if args.zones:
+        zones = gpd.read_file(args.zones).to_crs(epsg=4326)
+    else:
+        zones = synthetic_zones(args.zone_count)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = MockOTPServer.start_server(**MockOTPServer.server_options(args))
+        url = server.url
+        print(f"Mock OTP on {url}: {args.latency * 1000:.0f} ms + {args.plan_latency * 1000:.0f} ms/plan, "
+              f"{args.workers} workers, error rate {args.error_rate}, no-route rate {args.no_route_rate}")
+
+    print(f"Sweeping {len(zones)} zones, {args.mode} {args.direction}, "
+          f"max_in_flight={args.max_in_flight}, batch_size={args.batch_size}")
+    try:
+        result = run_benchmark(zones, url, args.mode, args.direction, args.max_in_flight, args.batch_size,
+                               args.focus_zone, args.log)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,96 +6,407 @@ Created on Thu Aug  8 17:16:17 2024
 @author: noamgal
 """
 
-import csv
+import argparse
+import hashlib
+import io
 import shutil
 import tempfile
 import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 
-def update_translations(input_file):
-    """Update the translations.txt file."""
-    temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, newline='', encoding='utf-8')
+import numpy as np
+import pandas as pd
 
-    with open(input_file, 'r', encoding='utf-8') as infile, temp_file:
-        reader = csv.reader(infile)
-        writer = csv.writer(temp_file)
-        
-        # Write new header
-        writer.writerow(['trans_id', 'table_name', 'field_name', 'language', 'translation'])
-        
-        # Skip the old header
-        next(reader)
-        
-        # Process and write each row
-        for row in reader:
-            if len(row) == 5 and all(field.strip() for field in row):
-                trans_id, table_name, _, language, translation = [field.strip() for field in row]
-                writer.writerow([trans_id, table_name, 'name', language, translation])
+from GTFSManifest import MANIFEST_FILENAME, Manifest, file_hash
 
-    replace_file(temp_file.name, input_file)
+# Files are read and written in chunks of this many rows, so stop_times.txt and shapes.txt
+# (millions of rows) can go through the same cleaners in bounded memory
+CHUNK_ROWS = 500_000
 
-def update_routes(input_file):
-    """Update the routes.txt file."""
-    temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, newline='', encoding='utf-8')
+TRANSLATION_COLUMNS = ['trans_id', 'table_name', 'field_name', 'language', 'translation']
 
-    def map_route_type(route_type):
-        return '3' if route_type == '8' else '2' if route_type == '715' else route_type
-
-    with open(input_file, 'r', encoding='utf-8') as infile, temp_file:
-        reader = csv.reader(infile)
-        writer = csv.writer(temp_file)
-        
-        header = next(reader)
-        writer.writerow(header)
-        
-        for row in reader:
-            if len(row) > 5:
-                row[5] = map_route_type(row[5])
-            writer.writerow(row)
+# MOT route types OTP does not know: 8 is a bus, 715 is rail
+ROUTE_TYPE_MAP = {'8': '3', '715': '2'}
 
-    replace_file(temp_file.name, input_file)
+# Stations, entrances, generic nodes and boarding areas all become plain stops
+LOCATION_TYPE_MAP = {'1': '0', '2': '0', '3': '0', '4': '0'}
 
-def update_stops(input_file):
-    """Update the stops.txt file."""
+def clean_translations(table):
+    """Rename the translations.txt columns and set field_name to what OTP expects."""
+    table = table.apply(lambda column: column.str.strip())
+    # Drop rows with a missing field, as OTP rejects them
+    table = table[(table != '').all(axis=1)].copy()
+    table['field_name'] = 'name'
+    return table
+
+def clean_routes(table):
+    """Map the MOT route_type values 8 and 715, which OTP does not know, to bus and rail."""
+    table['route_type'] = table['route_type'].replace(ROUTE_TYPE_MAP)
+    return table
+
+def clean_stops(table):
+    """Turn stations, entrances and other location types into plain stops."""
+    table['location_type'] = table['location_type'].replace(LOCATION_TYPE_MAP)
+    return table
+
+# Files that need cleaning, the function applied to each chunk of rows and the columns it needs
+# (None to take the columns from the header); every other file is copied as is
+CLEANERS = {
+    'translations.txt': (clean_translations, TRANSLATION_COLUMNS),
+    'routes.txt': (clean_routes, None),
+    'stops.txt': (clean_stops, None)
+}
+
+def read_chunks(source, columns=None):
+    """
+    Read a GTFS file as chunks of text columns, by header name.
+
+    Everything is kept as a string, with empty fields as '', so values that
+    are not cleaned are written back exactly as they were. With columns, the
+    file's own header is replaced and rows with extra fields are skipped.
+    """
+    options = {'dtype': str, 'keep_default_na': False, 'encoding': 'utf-8-sig', 'chunksize': CHUNK_ROWS}
+    if columns is not None:
+        options.update(header=0, names=columns, on_bad_lines='skip')
+    return pd.read_csv(source, **options)
+
+def transform_table(source, destination, transform, columns=None):
+    """Stream a GTFS file from source to destination (paths or file objects) through transform, chunk by chunk."""
+    header = True
+    for chunk in read_chunks(source, columns):
+        try:
+            transformed = transform(chunk)
+        except KeyError as e:
+            raise ValueError(f"{getattr(source, 'name', source)} has no {e} column") from None
+        transformed.to_csv(destination, index=False, header=header)
+        header = False
+    if header:
+        # An empty file still gets its header
+        pd.DataFrame(columns=columns).to_csv(destination, index=False)
+
+def clean_table(source, destination, filename):
+    """Stream a GTFS file through its cleaner."""
+    clean, columns = CLEANERS[filename]
+    transform_table(source, destination, clean, columns)
+
+def rewrite_file(input_file, transform, columns=None):
+    """Rewrite a GTFS file in place through transform."""
     temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, newline='', encoding='utf-8')
 
-    def map_location_type(loc_type):
-        return '0' if loc_type in ['1', '2', '3', '4'] else loc_type
-
-    with open(input_file, 'r', encoding='utf-8') as infile, temp_file:
-        reader = csv.reader(infile)
-        writer = csv.writer(temp_file)
-        
-        header = next(reader)
-        writer.writerow(header)
-        
-        for row in reader:
-            if len(row) > 6:
-                row[6] = map_location_type(row[6])
-            writer.writerow(row)
+    with temp_file:
+        transform_table(input_file, temp_file, transform, columns)
 
     replace_file(temp_file.name, input_file)
 
+def update_file(input_file, filename):
+    """Clean a GTFS file in place."""
+    clean, columns = CLEANERS[filename]
+    rewrite_file(input_file, clean, columns)
+
+def update_translations(input_file):
+    """Update the translations.txt file."""
+    update_file(input_file, 'translations.txt')
+
+def update_routes(input_file):
+    """Update the routes.txt file."""
+    update_file(input_file, 'routes.txt')
+
+def update_stops(input_file):
+    """Update the stops.txt file."""
+    update_file(input_file, 'stops.txt')
+
 def replace_file(temp_file, original_file):
     """Replace the original file with the temporary file."""
     shutil.move(temp_file, original_file)
     print(f"Updated {original_file}")
 
 def clean_gtfs(directory):
-    """Clean GTFS files in the specified directory."""
-    files_to_clean = {
-        'translations.txt': update_translations,
-        'routes.txt': update_routes,
-        'stops.txt': update_stops
-    }
-
-    for filename, update_function in files_to_clean.items():
+    """
+    Clean GTFS files in the specified directory and return the feed version.
+
+    Files already cleaned by an earlier run (their content matches the output
+    recorded in the manifest) are skipped, so running it twice is harmless.
+    """
+    manifest = Manifest(os.path.join(directory, MANIFEST_FILENAME))
+    for filename in CLEANERS:
         file_path = os.path.join(directory, filename)
-        if os.path.exists(file_path):
-            update_function(file_path)
-        else:
+        if not os.path.exists(file_path):
             print(f"Warning: {filename} not found in the specified directory.")
+        elif manifest.is_clean(filename, file_path):
+            print(f"{file_path} is already clean")
+        else:
+            input_hash = file_hash(file_path)
+            update_file(file_path, filename)
+            manifest.record(filename, input_hash, file_hash(file_path), file_path)
+
+    manifest.refresh(directory)
+    return manifest.save()
+
+def clean_member(zip_path, name):
+    """Clean one file of a GTFS zip in memory and return the cleaned CSV as UTF-8 bytes."""
+    output = io.StringIO(newline='')
+    with zipfile.ZipFile(zip_path) as archive, archive.open(name) as member:
+        clean_table(member, output, name)
+    return output.getvalue().encode('utf-8')
+
+def zip_member_id(info):
+    """Identify a zip member's content by the CRC-32 and size stored in the zip, without reading it."""
+    return f"crc32:{info.CRC:08x}:{info.file_size}"
+
+def clean_gtfs_zip(input_zip, output_zip=None, workers=None):
+    """
+    Clean a GTFS zip (e.g. the MOT download) straight into a new zip, without extracting it.
+
+    The files in CLEANERS are cleaned in parallel worker processes while the
+    other files are streamed across in chunks, so the large stop_times.txt and
+    shapes.txt never touch the disk uncompressed.
+
+    Without output_zip the cleaned feed is written to
+    <name>-clean-<version>.zip, where version starts the feed version (a hash
+    of the cleaned content). A manifest next to it records the input members;
+    when none changed the existing output is reused, and cleaned members whose
+    input did not change are copied from it instead of being cleaned again.
+    Returns the feed version.
+    """
+    base = os.path.splitext(output_zip)[0] if output_zip else f"{os.path.splitext(input_zip)[0]}-clean"
+    manifest = Manifest(f"{base}.manifest.json")
+    previous_zip = manifest.data.get('output_zip')
+    if previous_zip is not None and not os.path.exists(previous_zip):
+        previous_zip = None
+
+    with zipfile.ZipFile(input_zip) as archive:
+        members = archive.infolist()
+    names = {info.filename for info in members}
+    for filename in CLEANERS:
+        if filename not in names:
+            print(f"Warning: {filename} not found in {input_zip}.")
+
+    unchanged = {info.filename for info in members
+                 if manifest.files.get(info.filename, {}).get('input') == zip_member_id(info)}
+    if previous_zip is not None and unchanged == names == set(manifest.files) \
+            and (output_zip is None or previous_zip == output_zip):
+        print(f"{input_zip} has not changed since {previous_zip} was written")
+        return manifest.version
+
+    temp_zip = f"{base}.tmp.zip"
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            zipfile.ZipFile(input_zip) as archive, \
+            zipfile.ZipFile(temp_zip, 'w', compression=zipfile.ZIP_DEFLATED) as output:
+        reuse = unchanged & set(CLEANERS) if previous_zip is not None else set()
+        cleaned = {info.filename: pool.submit(clean_member, input_zip, info.filename)
+                   for info in members if info.filename in CLEANERS and info.filename not in reuse}
+
+        output_hashes = {}
+        for info in members:
+            if info.filename not in CLEANERS:
+                target = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                target.compress_type = zipfile.ZIP_DEFLATED
+                digest = hashlib.sha256()
+                with archive.open(info) as source, output.open(target, 'w', force_zip64=True) as destination:
+                    for block in iter(lambda: source.read(1 << 20), b''):
+                        digest.update(block)
+                        destination.write(block)
+                output_hashes[info.filename] = digest.hexdigest()
+
+        for info in members:
+            if info.filename in CLEANERS:
+                if info.filename in reuse:
+                    with zipfile.ZipFile(previous_zip) as previous:
+                        data = previous.read(info.filename)
+                    print(f"{info.filename} has not changed, reusing it from {previous_zip}")
+                else:
+                    data = cleaned[info.filename].result()
+                    print(f"Updated {info.filename}")
+                target = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                output.writestr(target, data, compress_type=zipfile.ZIP_DEFLATED)
+                output_hashes[info.filename] = hashlib.sha256(data).hexdigest()
+
+    manifest.files.clear()
+    for info in members:
+        manifest.record(info.filename, zip_member_id(info), output_hashes[info.filename])
+    version = manifest.save()
+    final_zip = output_zip or f"{base}-{version[:12]}.zip"
+    os.replace(temp_zip, final_zip)
+    manifest.data['output_zip'] = final_zip
+    manifest.save()
+    print(f"Cleaned feed written to {final_zip}")
+    return version
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+def read_table(path, columns=None):
+    """Read a whole (small) GTFS file as text columns; None if the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    return pd.concat(read_chunks(path, columns), ignore_index=True)
+
+def active_services(directory, start_date, end_date):
+    """
+    Service ids running on at least one day from start_date to end_date (inclusive).
+
+    A service removed by calendar_dates.txt on some days of the window is
+    kept, since it may still run on the others.
+    """
+    days = pd.date_range(start_date, end_date)
+    active = set()
+
+    calendar = read_table(os.path.join(directory, 'calendar.txt'))
+    if calendar is not None:
+        for day in days:
+            stamp = day.strftime('%Y%m%d')
+            running = (calendar[WEEKDAYS[day.weekday()]] == '1') & \
+                (calendar['start_date'] <= stamp) & (calendar['end_date'] >= stamp)
+            active.update(calendar.loc[running, 'service_id'])
+
+    calendar_dates = read_table(os.path.join(directory, 'calendar_dates.txt'))
+    if calendar_dates is not None:
+        added = (calendar_dates['exception_type'] == '1') & \
+            calendar_dates['date'].between(days[0].strftime('%Y%m%d'), days[-1].strftime('%Y%m%d'))
+        active.update(calendar_dates.loc[added, 'service_id'])
+
+    return active
+
+def stops_in_area(stops, bbox=None, area=None):
+    """
+    Boolean mask of the stops inside bbox (min_lon, min_lat, max_lon, max_lat) and the area polygon.
+
+    Stops without coordinates (e.g. generic nodes and boarding areas) count as outside.
+    """
+    lat = pd.to_numeric(stops['stop_lat'], errors='coerce').to_numpy(float)
+    lon = pd.to_numeric(stops['stop_lon'], errors='coerce').to_numpy(float)
+    inside = ~(np.isnan(lat) | np.isnan(lon))
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        inside &= (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+    if area is not None:
+        import shapely
+        inside &= shapely.contains_xy(area, lon, lat)
+    return inside
+
+def prune_gtfs(directory, start_date, end_date, bbox=None, area=None):
+    """
+    Keep only the trips of a GTFS directory that run between start_date and end_date.
+
+    With bbox or area (a shapely polygon in EPSG:4326), stops outside it are
+    removed as well, and trips left with fewer than two stops are dropped.
+    The pruning cascades through stop_times, trips, routes, agency, shapes,
+    stops, calendar, calendar_dates, transfers, frequencies and fare_rules,
+    so the feed stays consistent. Files are rewritten in place, and the new
+    feed version is returned.
+    """
+    def path(filename):
+        return os.path.join(directory, filename)
+
+    services = active_services(directory, start_date, end_date)
+    trips = read_table(path('trips.txt'))
+    trip_ids = set(trips.loc[trips['service_id'].isin(services), 'trip_id'])
+
+    stops = read_table(path('stops.txt'))
+    area_stops = set(stops.loc[stops_in_area(stops, bbox, area), 'stop_id'])
+
+    if bbox is not None or area is not None:
+        # First pass: a trip needs at least two stops inside the area to stay useful
+        stops_per_trip = pd.Series(dtype='int64')
+        for chunk in read_chunks(path('stop_times.txt')):
+            chunk = chunk[chunk['trip_id'].isin(trip_ids) & chunk['stop_id'].isin(area_stops)]
+            stops_per_trip = stops_per_trip.add(chunk['trip_id'].value_counts(), fill_value=0)
+        trip_ids = set(stops_per_trip.index[stops_per_trip >= 2])
+
+    used_stops = set()
+    def prune_stop_times(chunk):
+        chunk = chunk[chunk['trip_id'].isin(trip_ids) & chunk['stop_id'].isin(area_stops)]
+        used_stops.update(chunk['stop_id'].unique())
+        return chunk
+    rewrite_file(path('stop_times.txt'), prune_stop_times)
+
+    trips = trips[trips['trip_id'].isin(trip_ids)]
+    rewrite_file(path('trips.txt'), lambda chunk: chunk[chunk['trip_id'].isin(trip_ids)])
+    route_ids = set(trips['route_id'])
+    service_ids = set(trips['service_id'])
+
+    routes = read_table(path('routes.txt'))
+    rewrite_file(path('routes.txt'), lambda chunk: chunk[chunk['route_id'].isin(route_ids)])
+    if 'agency_id' in routes and os.path.exists(path('agency.txt')):
+        agency_ids = set(routes.loc[routes['route_id'].isin(route_ids), 'agency_id'])
+        rewrite_file(path('agency.txt'), lambda chunk: chunk[chunk['agency_id'].isin(agency_ids)])
+
+    if 'shape_id' in trips and os.path.exists(path('shapes.txt')):
+        shape_ids = set(trips['shape_id'])
+        rewrite_file(path('shapes.txt'), lambda chunk: chunk[chunk['shape_id'].isin(shape_ids)])
+
+    # Parent stations of the stops still in use are kept so parent_station stays valid
+    if 'parent_station' in stops:
+        used_stops |= set(stops.loc[stops['stop_id'].isin(used_stops), 'parent_station']) - {''}
+    rewrite_file(path('stops.txt'), lambda chunk: chunk[chunk['stop_id'].isin(used_stops)])
+
+    window = (pd.Timestamp(start_date).strftime('%Y%m%d'), pd.Timestamp(end_date).strftime('%Y%m%d'))
+    if os.path.exists(path('calendar.txt')):
+        def prune_calendar(chunk):
+            chunk = chunk[chunk['service_id'].isin(service_ids)].copy()
+            # Clip every service to the window so OTP builds no other service days
+            chunk['start_date'] = chunk['start_date'].where(chunk['start_date'] > window[0], window[0])
+            chunk['end_date'] = chunk['end_date'].where(chunk['end_date'] < window[1], window[1])
+            return chunk[chunk['start_date'] <= chunk['end_date']]
+        rewrite_file(path('calendar.txt'), prune_calendar)
+    if os.path.exists(path('calendar_dates.txt')):
+        rewrite_file(path('calendar_dates.txt'), lambda chunk: chunk[
+            chunk['service_id'].isin(service_ids) & chunk['date'].between(*window)])
+
+    if os.path.exists(path('transfers.txt')):
+        def prune_transfers(chunk):
+            keep = chunk['from_stop_id'].isin(used_stops) & chunk['to_stop_id'].isin(used_stops)
+            for column in ('from_trip_id', 'to_trip_id'):
+                if column in chunk:
+                    keep &= (chunk[column] == '') | chunk[column].isin(trip_ids)
+            return chunk[keep]
+        rewrite_file(path('transfers.txt'), prune_transfers)
+    if os.path.exists(path('frequencies.txt')):
+        rewrite_file(path('frequencies.txt'), lambda chunk: chunk[chunk['trip_id'].isin(trip_ids)])
+    if os.path.exists(path('fare_rules.txt')):
+        rewrite_file(path('fare_rules.txt'), lambda chunk: chunk[
+            (chunk['route_id'] == '') | chunk['route_id'].isin(route_ids)] if 'route_id' in chunk else chunk)
+
+    print(f"Pruned {directory}: {len(trip_ids)} trips, {len(route_ids)} routes and {len(used_stops)} stops "
+          f"kept for {window[0]}-{window[1]}")
+
+    manifest = Manifest(os.path.join(directory, MANIFEST_FILENAME))
+    manifest.refresh(directory)
+    return manifest.save()
+
+def load_area(path):
+    """Union of the polygons in a shapefile (e.g. the TAZ zones), in EPSG:4326."""
+    import geopandas as gpd
+    return gpd.read_file(path).to_crs(epsg=4326).union_all()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean the Israel MOT GTFS feed for OTP.")
+    parser.add_argument('gtfs', help="GTFS directory to clean in place, or the downloaded GTFS zip")
+    parser.add_argument('--output',
+                        help="cleaned zip to write when cleaning a zip (default: <name>-clean-<feed version>.zip)")
+    parser.add_argument('--workers', type=int, help="worker processes for cleaning a zip")
+    parser.add_argument('--start-date', help="keep only trips running from this date, YYYY-MM-DD")
+    parser.add_argument('--end-date', help="... up to this date (default: the start date)")
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+                        help="keep only stops inside this box (with --start-date)")
+    parser.add_argument('--area', help="keep only stops inside the polygons of this shapefile, e.g. the TAZ zones "
+                             "(with --start-date)")
+    args = parser.parse_args()
+    if (args.bbox or args.area or args.end_date) and not args.start_date:
+        parser.error("--bbox, --area and --end-date prune the feed and need --start-date")
+    return args
 
 if __name__ == "__main__":
-    # Replace with the path to your Israel Public Transportation GTFS directory
-    gtfs_directory = '/path/to/your/gtfs/directory'
-    clean_gtfs(gtfs_directory)
\ No newline at end of file
+    # Pass the path to your Israel Public Transportation GTFS directory, or the zip downloaded from
+    # https://gtfs.mot.gov.il/gtfsfiles/ to write a cleaned copy of it without extracting the feed
+    args = parse_args()
+    if zipfile.is_zipfile(args.gtfs):
+        if args.start_date:
+            raise SystemExit("Pruning reads the feed several times; extract the zip and prune the directory")
+        version = clean_gtfs_zip(args.gtfs, args.output, args.workers)
+    else:
+        version = clean_gtfs(args.gtfs)
+        if args.start_date:
+            area = load_area(args.area) if args.area else None
+            version = prune_gtfs(args.gtfs, args.start_date, args.end_date or args.start_date, args.bbox, area)
+    print(f"Feed version: {version}")
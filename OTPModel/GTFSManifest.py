@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-hash manifest of a cleaned GTFS feed.
+
+Clean-Israel-GTFS.py records, for every file of the feed, the hash of what
+it read and of what it wrote. A file whose content still matches its
+recorded output is already clean and is skipped on the next run. The feed
+version is a hash over all output files. It changes exactly when the cleaned
+feed changes, so caches of results computed on the feed (e.g.
+TravelTimeCache) can be keyed on it:
+
+    python TravelTimes.py --feed-manifest /path/to/gtfs/gtfs_manifest.json
+"""
+
+import hashlib
+import json
+import os
+
+MANIFEST_FILENAME = 'gtfs_manifest.json'
+
+
+def file_hash(source):
+    """SHA-256 of a file, given a path or a binary file object."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    {'version': ..., 'files': {name: {'input', 'output', 'size', 'mtime_ns'}}} stored as JSON.
+
+    size and mtime_ns are only kept for files in a directory, so an unchanged
+    file is recognized without hashing it again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'version': None, 'files': {}}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    @property
+    def files(self):
+        return self.data['files']
+
+    @property
+    def version(self):
+        return self.data['version']
+
+    def current_hash(self, name, path):
+        """Hash of a file in a directory, reusing the recorded one if its size and mtime are unchanged."""
+        entry = self.files.get(name)
+        stat = os.stat(path)
+        if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry['output']
+        return file_hash(path)
+
+    def is_clean(self, name, path):
+        """True if a file in a directory is still the output recorded for it."""
+        entry = self.files.get(name)
+        return entry is not None and self.current_hash(name, path) == entry['output']
+
+    def record(self, name, input_hash, output_hash, path=None):
+        entry = {'input': input_hash, 'output': output_hash}
+        if path is not None:
+            stat = os.stat(path)
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        self.files[name] = entry
+
+    def refresh(self, directory):
+        """Record the current hash of every GTFS file in a directory as its output."""
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.txt'))
+        for name in names:
+            path = os.path.join(directory, name)
+            output_hash = self.current_hash(name, path)
+            entry = self.files.get(name, {})
+            self.record(name, entry.get('input', output_hash), output_hash, path)
+        for name in set(self.files) - set(names):
+            del self.files[name]
+
+    def save(self):
+        """Compute the feed version from the output hashes, write the manifest and return the version."""
+        digest = hashlib.sha256()
+        for name in sorted(self.files):
+            digest.update(f"{name}:{self.files[name]['output']}\n".encode())
+        self.data['version'] = digest.hexdigest()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        return self.version
+
+
+def feed_version(path):
+    """Feed version of a cleaned GTFS directory, or of a manifest file."""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILENAME)
+    version = Manifest(path).version
+    if version is None:
+        raise FileNotFoundError(f"No feed version recorded in {path}; run Clean-Israel-GTFS.py first")
+    return version
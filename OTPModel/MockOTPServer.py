@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight stand-in for the OTP GraphQL plan endpoint.
+
+It answers the (batched) plan queries sent by OTPClient with synthetic
+durations derived from the straight-line distance, so the travel-time
+pipeline can be exercised and benchmarked without building an OTP graph.
+Latency, error rate, no-route rate and the number of requests processed at
+once (OTP's routing threads) are configurable.
+
+Run it in place of OTP with:
+    python MockOTPServer.py --port 8080 --latency 0.02 --error-rate 0.01
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PLAN_ALIAS = re.compile(r'\b(p\d+)\s*:\s*plan\b')
+
+# Synthetic speeds (km/h) and fixed overheads (minutes) per OTP mode
+SPEEDS = {'CAR': 50.0, 'TRANSIT': 20.0}
+OVERHEADS = {'CAR': 2.0, 'TRANSIT': 12.0}
+
+
+def distance_km(from_point, to_point):
+    """Great-circle distance between two {'lat', 'lon'} points."""
+    lat1, lon1 = math.radians(from_point['lat']), math.radians(from_point['lon'])
+    lat2, lon2 = math.radians(to_point['lat']), math.radians(to_point['lon'])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def synthetic_duration(from_point, to_point, mode):
+    """Travel time in seconds, with 30% detour on top of the straight line."""
+    minutes = OVERHEADS[mode] + 1.3 * distance_km(from_point, to_point) / SPEEDS[mode] * 60
+    return int(minutes * 60)
+
+
+class MockOTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.02, plan_latency=0.0, error_rate=0.0, plan_error_rate=0.0,
+                 no_route_rate=0.02, workers=8, seed=0):
+        super().__init__(address, MockOTPHandler)
+        self.latency = latency
+        self.plan_latency = plan_latency
+        self.error_rate = error_rate
+        self.plan_error_rate = plan_error_rate
+        self.no_route_rate = no_route_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        # OTP routes a bounded number of requests at once, further requests queue
+        self.workers = threading.BoundedSemaphore(workers)
+        self.requests_served = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/otp/routers/default/index/graphql"
+
+    def draw(self):
+        with self.random_lock:
+            return self.random.random()
+
+    def unroutable(self, point):
+        """Deterministic per point, like a point OTP cannot snap to the street network."""
+        key = f"{self.seed}:{point['lat']:.5f},{point['lon']:.5f}".encode()
+        return zlib.crc32(key) / 2 ** 32 < self.no_route_rate
+
+    def answer(self, payload):
+        """Return (status, body) for a GraphQL request payload."""
+        query = payload.get('query', '')
+        variables = payload.get('variables', {})
+        aliases = PLAN_ALIAS.findall(query)
+
+        with self.workers:
+            time.sleep(self.latency + self.plan_latency * len(aliases))
+            with self.random_lock:
+                self.requests_served += 1
+            if self.draw() < self.error_rate:
+                return 503, {'errors': [{'message': 'Service temporarily overloaded'}]}
+
+            data, errors = {}, []
+            mode = variables.get('mode', 'CAR')
+            for alias in aliases:
+                i = alias[1:]
+                from_point, to_point = variables[f'from{i}'], variables[f'to{i}']
+                if self.draw() < self.plan_error_rate:
+                    data[alias] = None
+                    errors.append({'message': 'Routing timed out', 'path': [alias]})
+                elif self.unroutable(from_point) or self.unroutable(to_point):
+                    data[alias] = {'itineraries': []}
+                else:
+                    data[alias] = {'itineraries': [{'duration': synthetic_duration(from_point, to_point, mode)}]}
+
+        body = {'data': data}
+        if errors:
+            body['errors'] = errors
+        return 200, body
+
+
+class MockOTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, keep-alive
+    # connections stall on delayed ACKs and add ~40 ms to every request
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length))
+            status, body = self.server.answer(payload)
+        except (ValueError, KeyError) as e:
+            status, body = 400, {'errors': [{'message': f'Bad request: {e}'}]}
+
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, **options):
+    """Start a MockOTPServer on a background thread and return it; stop it with shutdown()."""
+    server = MockOTPServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every request")
+    parser.add_argument('--plan-latency', type=float, default=0.0, help="seconds added per plan in a request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument('--plan-error-rate', type=float, default=0.0,
+                        help="share of plans answered with a GraphQL field error")
+    parser.add_argument('--no-route-rate', type=float, default=0.02,
+                        help="share of points that never get an itinerary")
+    parser.add_argument('--workers', type=int, default=8, help="requests processed at once, like OTP's routing threads")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def server_options(args):
+    return {'latency': args.latency, 'plan_latency': args.plan_latency, 'error_rate': args.error_rate,
+            'plan_error_rate': args.plan_error_rate, 'no_route_rate': args.no_route_rate,
+            'workers': args.workers, 'seed': args.seed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic OTP plan responses.")
+    parser.add_argument('--port', type=int, default=8080)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockOTPServer(('127.0.0.1', args.port), **server_options(args))
+    print(f"Mock OTP listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query engine for the local OTP GraphQL endpoint.
+
+Requests are sent from a bounded pool of worker threads, each holding its own
+keep-alive session, so a local OTP instance is kept busy instead of waiting on
+one blocking request at a time.
+"""
+
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from RequestPolicy import OK, NO_ROUTE, TRANSIENT, FATAL, AdaptiveLimiter, backoff_delay, \
+    classify_exception, classify_response
+
+# OTP GTFS GraphQL local API endpoint
+OTP_URL = "http://localhost:8080/otp/routers/default/index/graphql"
+
+PLAN_FIELD = """
+  p{i}: plan(
+    from: $from{i}
+    to: $to{i}
+    date: $date
+    time: $time
+    transportModes: [{{mode: $mode}}]
+  ) {{
+    itineraries {{
+      duration
+    }}
+  }}
+"""
+
+# Routing time limit OTP is asked to respect, and how much longer the client waits for the response
+OTP_TIMEOUT = 180
+CLIENT_TIMEOUT_MARGIN = 10
+
+# Number of plans packed into one GraphQL request by default
+BATCH_SIZE = 25
+
+
+def build_batch_query(n):
+    """Build a query with n aliased plan fields (p0 ... pn-1) sharing date, time and mode."""
+    arguments = ", ".join(f"$from{i}: InputCoordinates!, $to{i}: InputCoordinates!" for i in range(n))
+    fields = "".join(PLAN_FIELD.format(i=i) for i in range(n))
+    return f"query ({arguments}, $date: String!, $time: String!, $mode: Mode!) {{{fields}}}"
+
+
+def query_plans(pairs, mode, departure_time, session=requests, url=OTP_URL, timeout=OTP_TIMEOUT):
+    """
+    Query one plan per (from_lat, from_lon, to_lat, to_lon) pair in a single request.
+
+    Returns (outcomes, travel_times): a RequestPolicy outcome per plan and the
+    travel time in minutes for the plans whose outcome is OK (None otherwise).
+    """
+    variables = {
+        "date": departure_time.strftime("%Y-%m-%d"),
+        "time": departure_time.strftime("%H:%M:%S"),
+        "mode": "CAR" if mode == "AUTO" else "TRANSIT"
+    }
+    for i, (from_lat, from_lon, to_lat, to_lon) in enumerate(pairs):
+        variables[f"from{i}"] = {"lat": from_lat, "lon": from_lon}
+        variables[f"to{i}"] = {"lat": to_lat, "lon": to_lon}
+
+    headers = {
+        'Content-Type': 'application/json',
+        'OTPTimeout': str(int(timeout * 1000))
+    }
+
+    travel_times = [None] * len(pairs)
+    try:
+        response = session.post(url, json={"query": build_batch_query(len(pairs)), "variables": variables},
+                                headers=headers, timeout=timeout + CLIENT_TIMEOUT_MARGIN)
+
+        outcome = classify_response(response)
+        if outcome is not None:
+            print(f"Error response (status {response.status_code}): {response.text[:200]}")
+            return [outcome] * len(pairs), travel_times
+
+        body = response.json()
+    except Exception as e:
+        print(f"Exception occurred: {str(e)}")
+        return [classify_exception(e)] * len(pairs), travel_times
+
+    if not isinstance(body, dict):
+        # A 200 whose body is not a GraphQL response, e.g. from a proxy in front of OTP
+        print(f"Malformed response: {response.text[:200]}")
+        return [TRANSIENT] * len(pairs), travel_times
+
+    data = body.get('data')
+    if data is None:
+        # The whole query was rejected, e.g. a validation error
+        print(f"Query rejected: {body.get('errors')}")
+        return [FATAL] * len(pairs), travel_times
+    if not isinstance(data, dict):
+        print(f"Malformed response: {response.text[:200]}")
+        return [TRANSIENT] * len(pairs), travel_times
+
+    # A plan that errored comes back as null (with an entry in 'errors'), one
+    # that found no route comes back with an empty itinerary list
+    outcomes = []
+    for i in range(len(pairs)):
+        plan = data.get(f"p{i}")
+        if not isinstance(plan, dict) or not isinstance(plan.get('itineraries'), list):
+            outcomes.append(TRANSIENT)
+        elif plan['itineraries']:
+            outcomes.append(OK)
+            travel_times[i] = plan['itineraries'][0]['duration'] / 60  # Convert seconds to minutes
+        else:
+            outcomes.append(NO_ROUTE)
+
+    return outcomes, travel_times
+
+
+class OTPEndpoint:
+    """State of one OTP router as seen by the client."""
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.latency = None  # Exponentially weighted mean request time in seconds
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def __repr__(self):
+        return f"OTPEndpoint({self.url!r}, in_flight={self.in_flight}, latency={self.latency})"
+
+
+class OTPEndpointPool:
+    """
+    Share requests across several OTP routers (e.g. one JVM per port).
+
+    Each request goes to the live endpoint with the lowest expected wait,
+    estimated as (requests in flight + 1) x mean latency. An endpoint is taken
+    out of rotation for cooldown seconds after failure_threshold consecutive
+    failed requests, or when its mean latency exceeds slow_factor times the
+    median of the other endpoints. When every endpoint is out of rotation,
+    requests wait for the first cooldown to end instead of hammering a
+    server that is down (a circuit breaker per endpoint).
+    """
+
+    def __init__(self, urls, failure_threshold=5, cooldown=10.0, slow_factor=4.0, smoothing=0.2):
+        if isinstance(urls, str):
+            urls = [urls]
+        self.endpoints = [OTPEndpoint(url) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_factor = slow_factor
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def acquire(self):
+        """Pick an endpoint for the next request and count it as in flight."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                live = [e for e in self.endpoints if e.down_until <= now]
+                if live:
+                    return self._pick(live)
+                wait_for = min(e.down_until for e in self.endpoints) - now
+            time.sleep(wait_for)
+
+    def _pick(self, live):
+        known = [e.latency for e in live if e.latency is not None]
+        default_latency = statistics.median(known) if known else 1.0
+        endpoint = min(live, key=lambda e: (e.in_flight + 1) * (e.latency or default_latency))
+        endpoint.in_flight += 1
+        return endpoint
+
+    def release(self, endpoint, elapsed, ok):
+        """Record the outcome of a request sent with acquire()."""
+        with self._lock:
+            endpoint.in_flight -= 1
+            now = time.monotonic()
+            if endpoint.down_until > now:
+                # Requests that were in flight when it was taken out of rotation
+                return
+            if not ok:
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    print(f"OTP endpoint {endpoint.url} failed {endpoint.consecutive_failures} times, "
+                          f"out of rotation for {self.cooldown:.0f} s")
+                    endpoint.down_until = now + self.cooldown
+                    endpoint.consecutive_failures = 0
+                return
+
+            endpoint.consecutive_failures = 0
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += self.smoothing * (elapsed - endpoint.latency)
+
+            others = [e.latency for e in self.endpoints if e is not endpoint and e.latency is not None]
+            if others and endpoint.latency > self.slow_factor * statistics.median(others):
+                print(f"OTP endpoint {endpoint.url} is slow ({endpoint.latency:.2f} s per request), "
+                      f"out of rotation for {self.cooldown:.0f} s")
+                endpoint.down_until = now + self.cooldown
+                # Start from the median again so the probe is judged on fresh timings
+                endpoint.latency = statistics.median(others)
+
+
+class OTPQueryEngine:
+    """
+    Run OTP queries on a bounded number of threads with pooled connections.
+
+    url may be a single endpoint or a list of endpoints to share the load
+    across (see OTPEndpointPool). Up to batch_size plans are sent per request.
+    Plans with a TRANSIENT outcome are re-issued on the same points up to
+    batch_retries times after an exponential backoff, and an AdaptiveLimiter
+    lowers the number of requests in flight below max_in_flight while OTP is
+    overloaded (see RequestPolicy). If a TravelTimeCache is given, cached
+    travel times are returned without querying OTP and new ones are stored in
+    it. Every HTTP request is recorded in metrics (a TravelTimeMetrics.RunMetrics)
+    if one is given, labelled with the mode and the direction passed to
+    query_plans.
+    """
+
+    def __init__(self, url=OTP_URL, max_in_flight=8, cache=None, batch_size=BATCH_SIZE, batch_retries=2,
+                 metrics=None, timeout=OTP_TIMEOUT):
+        self.endpoints = OTPEndpointPool(url)
+        self.max_in_flight = max_in_flight
+        self.limiter = AdaptiveLimiter(max_in_flight)
+        self.cache = cache
+        self.batch_size = batch_size
+        self.batch_retries = batch_retries
+        self.metrics = metrics
+        self.timeout = timeout
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def session(self):
+        """Return the keep-alive session owned by the calling thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def get_travel_time(self, from_lat, from_lon, to_lat, to_lon, mode, departure_time):
+        """Query a single plan on the calling thread's pooled session."""
+        return self.get_travel_times([(from_lat, from_lon, to_lat, to_lon)], mode, departure_time)[0]
+
+    def get_travel_times(self, pairs, mode, departure_time):
+        """
+        Return travel times in minutes (or None) for a list of
+        (from_lat, from_lon, to_lat, to_lon) pairs sharing a mode and departure time.
+        """
+        return self.query_plans(pairs, mode, departure_time)[1]
+
+    def _send(self, pairs, mode, departure_time, direction=None, retry=False):
+        """Send one request through the limiter and endpoint pool."""
+        self.limiter.acquire()
+        endpoint = self.endpoints.acquire()
+        started = time.monotonic()
+        try:
+            outcomes, travel_times = query_plans(pairs, mode, departure_time, session=self.session(),
+                                                 url=endpoint.url, timeout=self.timeout)
+        except BaseException:
+            self.limiter.release(time.monotonic() - started, overloaded=True)
+            self.endpoints.release(endpoint, time.monotonic() - started, ok=False)
+            raise
+        elapsed = time.monotonic() - started
+
+        transient = outcomes.count(TRANSIENT)
+        self.limiter.release(elapsed, overloaded=transient > 0)
+        # A request is only held against the endpoint if nothing in it succeeded
+        self.endpoints.release(endpoint, elapsed, ok=transient < len(pairs))
+        if self.metrics is not None:
+            self.metrics.record_request(endpoint.url, mode, direction, elapsed, outcomes, retry)
+        return outcomes, travel_times
+
+    def query_plans(self, pairs, mode, departure_time, direction=None):
+        """
+        Return (outcomes, travel_times) for a list of (from_lat, from_lon, to_lat, to_lon)
+        pairs sharing a mode and departure time; see RequestPolicy for the outcomes.
+        direction only labels the requests in metrics.
+        """
+        outcomes = [TRANSIENT] * len(pairs)
+        travel_times = [None] * len(pairs)
+        todo = list(range(len(pairs)))
+
+        if self.cache is not None:
+            todo = []
+            for i, pair in enumerate(pairs):
+                travel_times[i] = self.cache.get(*pair, mode, departure_time)
+                if travel_times[i] is None:
+                    todo.append(i)
+                else:
+                    outcomes[i] = OK
+
+        for retry in range(self.batch_retries + 1):
+            if not todo:
+                break
+            if retry > 0:
+                time.sleep(backoff_delay(retry - 1))
+            failed = []
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                batch_outcomes, batch_times = self._send([pairs[i] for i in batch], mode, departure_time,
+                                                         direction, retry > 0)
+                for i, outcome, travel_time in zip(batch, batch_outcomes, batch_times):
+                    outcomes[i] = outcome
+                    travel_times[i] = travel_time
+                    # Only found routes are cached, a failed query may just be a busy server
+                    if self.cache is not None and outcome == OK:
+                        self.cache.put(*pairs[i], mode, departure_time, travel_time)
+                    if outcome == TRANSIENT:
+                        failed.append(i)
+            # Only the plans that failed transiently are sent again, on the same points
+            todo = failed
+
+        return outcomes, travel_times
+
+    def map_unordered(self, func, items):
+        """
+        Apply func to every item on the worker pool and yield (item, result)
+        pairs as they complete. At most max_in_flight calls run at once and
+        only a small window of items is submitted ahead, so items may be a
+        lazy iterable.
+        """
+        # The pool outlives a single call so worker threads keep their sessions
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+
+        pending = {}
+        for item in items:
+            if len(pending) >= 2 * self.max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            pending[self._pool.submit(func, item)] = item
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
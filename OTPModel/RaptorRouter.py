@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process RAPTOR transit router over the cleaned GTFS feed.
+
+load_timetable reads the GTFS directory written by Clean-Israel-GTFS.py for
+one service date into NumPy arrays: trips grouped into route patterns (trips
+serving the same stop sequence, split so that no trip overtakes another),
+their arrival and departure times as one flat array per pattern, and walking
+transfers between nearby stops. RaptorRouter then runs round-based RAPTOR
+from a point: every round rides each pattern touched in the previous round
+(vectorized over the pattern's stops and trips) and walks the transfers, so
+round k holds the earliest arrivals with at most k - 1 transfers.
+
+Travel times are measured from the requested departure time, so they include
+the initial wait for the first vehicle. Access and egress walks are the
+straight-line AccessLinks between zone points and stops.
+
+Run it as a script to compute the full TAZ_1270 transit matrix without OTP:
+    python RaptorRouter.py --gtfs /path/to/gtfs --date 2024-09-01 --time 07:30 --workers 8
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from AccessLinks import MAX_WALK, WALK_SPEED, StopIndex, load_access_links, read_stops, to_metres
+
+# Number of vehicles a journey may use (i.e. up to MAX_ROUNDS - 1 transfers)
+MAX_ROUNDS = 5
+
+UNREACHED = np.iinfo(np.int32).max
+
+STOP_TIMES_CHUNK = 1_000_000
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def parse_gtfs_times(values):
+    """Convert GTFS HH:MM:SS strings (hours may exceed 24) to seconds after midnight."""
+    parts = values.str.strip().str.split(':', expand=True).astype(np.int32)
+    return (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy(np.int32)
+
+
+def active_service_ids(gtfs_dir, service_date):
+    """Service ids running on service_date according to calendar.txt and calendar_dates.txt."""
+    day = service_date.strftime('%Y%m%d')
+    active = set()
+
+    calendar_path = os.path.join(gtfs_dir, 'calendar.txt')
+    if os.path.exists(calendar_path):
+        calendar = pd.read_csv(calendar_path, dtype=str)
+        weekday = WEEKDAYS[service_date.weekday()]
+        running = (calendar[weekday] == '1') & (calendar['start_date'] <= day) & (calendar['end_date'] >= day)
+        active.update(calendar.loc[running, 'service_id'])
+
+    calendar_dates_path = os.path.join(gtfs_dir, 'calendar_dates.txt')
+    if os.path.exists(calendar_dates_path):
+        exceptions = pd.read_csv(calendar_dates_path, dtype=str)
+        exceptions = exceptions[exceptions['date'] == day]
+        active.update(exceptions.loc[exceptions['exception_type'] == '1', 'service_id'])
+        active.difference_update(exceptions.loc[exceptions['exception_type'] == '2', 'service_id'])
+
+    return active
+
+
+def split_fifo(arrivals, departures):
+    """
+    Split the trips of one stop sequence (sorted by first departure) into groups
+    in which no trip overtakes another, so every time column is sorted.
+    """
+    groups = []
+    for trip in range(len(departures)):
+        for group in groups:
+            last = group[-1]
+            if (departures[trip] >= departures[last]).all() and (arrivals[trip] >= arrivals[last]).all():
+                group.append(trip)
+                break
+        else:
+            groups.append([trip])
+    return groups
+
+
+def csr_rows(offsets, keys):
+    """Positions of all entries of the given CSR rows, concatenated."""
+    starts = offsets[keys]
+    counts = offsets[keys + 1] - starts
+    skipped = np.cumsum(counts) - counts
+    return np.repeat(starts - skipped, counts) + np.arange(counts.sum())
+
+
+def csr(keys, values, size):
+    """Group values by integer keys in [0, size) into (offsets, values) arrays."""
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, values[order]
+
+
+class Timetable:
+    """
+    One service day of a GTFS feed as flat NumPy arrays.
+
+    Pattern p visits pattern_stops[pattern_stop_start[p]:pattern_stop_start[p + 1]]
+    with pattern_trips[p] trips, whose times are stored trip-major in
+    arrivals/departures[pattern_time_start[p]:pattern_time_start[p + 1]].
+    stop_pattern_* lists the patterns serving each stop and transfer_* the
+    stops reachable on foot from each stop, with the walk in seconds.
+    """
+
+    def __init__(self, stop_ids, stop_lat, stop_lon, pattern_stops, pattern_stop_start, pattern_trips,
+                 arrivals, departures, pattern_time_start, max_walk=MAX_WALK, walk_speed=WALK_SPEED):
+        self.stop_ids = stop_ids
+        self.stop_lat = stop_lat
+        self.stop_lon = stop_lon
+        self.pattern_stops = pattern_stops
+        self.pattern_stop_start = pattern_stop_start
+        self.pattern_trips = pattern_trips
+        self.arrivals = arrivals
+        self.departures = departures
+        self.pattern_time_start = pattern_time_start
+        self.max_walk = max_walk
+        self.walk_speed = walk_speed
+
+        self.stop_index = StopIndex(stop_lat, stop_lon)
+        self.lat0 = self.stop_index.lat0
+
+        pattern_of_stop = np.repeat(np.arange(len(pattern_trips)), np.diff(pattern_stop_start))
+        self.stop_pattern_start, self.stop_patterns = csr(pattern_stops, pattern_of_stop, len(stop_ids))
+        self.stop_patterns, self.stop_pattern_start = self._dedupe(self.stop_patterns, self.stop_pattern_start)
+
+        from_stop, to_stop, walk = self.stop_index.pairs(max_walk, walk_speed)
+        self.transfer_start, order_values = csr(from_stop, np.column_stack([to_stop, walk]), len(stop_ids))
+        self.transfer_to = order_values[:, 0].astype(np.int32)
+        self.transfer_walk = order_values[:, 1].astype(np.int32)
+
+    @staticmethod
+    def _dedupe(values, offsets):
+        # A looping pattern visits a stop twice but only needs to be listed once
+        keys = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        unique = np.unique(np.column_stack([keys, values]), axis=0)
+        new_offsets = np.zeros_like(offsets)
+        np.cumsum(np.bincount(unique[:, 0], minlength=len(offsets) - 1), out=new_offsets[1:])
+        return unique[:, 1], new_offsets
+
+    def __repr__(self):
+        return (f"Timetable({len(self.stop_ids)} stops, {len(self.pattern_trips)} patterns, "
+                f"{int(self.pattern_trips.sum())} trips, {len(self.transfer_to)} transfers)")
+
+    def patterns_at(self, stops):
+        """Unique patterns serving any of the given stops."""
+        return np.unique(self.stop_patterns[csr_rows(self.stop_pattern_start, stops)])
+
+    def walk_links(self, lat, lon):
+        """Stops within max_walk of each point, as CSR arrays (offsets, stops, walk seconds)."""
+        return self.stop_index.links(lat, lon, self.max_walk, self.walk_speed)
+
+
+def load_timetable(gtfs_dir, service_date, max_walk=MAX_WALK, walk_speed=WALK_SPEED):
+    """Load the trips running on service_date from a GTFS directory into a Timetable."""
+    started = time.perf_counter()
+    stops = read_stops(gtfs_dir)
+    stop_index = pd.Index(stops['stop_id'])
+
+    services = active_service_ids(gtfs_dir, service_date)
+    trips = pd.read_csv(os.path.join(gtfs_dir, 'trips.txt'), usecols=['trip_id', 'service_id'], dtype=str)
+    trip_index = pd.Index(trips.loc[trips['service_id'].isin(services), 'trip_id'])
+
+    # Stream stop_times so only the trips of the service day are kept in memory
+    columns = ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence']
+    parts = []
+    for chunk in pd.read_csv(os.path.join(gtfs_dir, 'stop_times.txt'), usecols=columns, dtype=str,
+                             chunksize=STOP_TIMES_CHUNK):
+        trip = trip_index.get_indexer(chunk['trip_id'])
+        keep = trip >= 0
+        chunk = chunk[keep]
+        parts.append(pd.DataFrame({
+            'trip': trip[keep].astype(np.int32),
+            'sequence': chunk['stop_sequence'].astype(np.int32).to_numpy(),
+            'stop': stop_index.get_indexer(chunk['stop_id']).astype(np.int32),
+            'arrival': parse_gtfs_times(chunk['arrival_time']),
+            'departure': parse_gtfs_times(chunk['departure_time']),
+        }))
+    stop_times = pd.concat(parts, ignore_index=True).sort_values(['trip', 'sequence'])
+    stop_times = stop_times[stop_times['stop'] >= 0]
+
+    trip_ids = stop_times['trip'].to_numpy()
+    stop_column = stop_times['stop'].to_numpy()
+    arrival_column = stop_times['arrival'].to_numpy()
+    departure_column = stop_times['departure'].to_numpy()
+    trip_starts = np.flatnonzero(np.r_[True, trip_ids[1:] != trip_ids[:-1]])
+    trip_ends = np.r_[trip_starts[1:], len(trip_ids)]
+
+    # Trips serving the same stop sequence share a pattern
+    sequences = {}
+    for start, end in zip(trip_starts, trip_ends):
+        if end - start >= 2:
+            sequences.setdefault(stop_column[start:end].tobytes(), []).append((start, end))
+
+    pattern_stops, pattern_trips, arrivals, departures = [], [], [], []
+    for trip_rows in sequences.values():
+        trip_rows.sort(key=lambda rows: departure_column[rows[0]])
+        arrival = np.stack([arrival_column[start:end] for start, end in trip_rows])
+        departure = np.stack([departure_column[start:end] for start, end in trip_rows])
+        stops_of_pattern = stop_column[trip_rows[0][0]:trip_rows[0][1]]
+        for group in split_fifo(arrival, departure):
+            pattern_stops.append(stops_of_pattern)
+            pattern_trips.append(len(group))
+            arrivals.append(arrival[group].ravel())
+            departures.append(departure[group].ravel())
+
+    pattern_stop_start = np.zeros(len(pattern_stops) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in pattern_stops], out=pattern_stop_start[1:])
+    pattern_time_start = np.zeros(len(pattern_stops) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrivals], out=pattern_time_start[1:])
+
+    timetable = Timetable(
+        stop_ids=stops['stop_id'].to_numpy(),
+        stop_lat=stops['stop_lat'].to_numpy(np.float64),
+        stop_lon=stops['stop_lon'].to_numpy(np.float64),
+        pattern_stops=np.concatenate(pattern_stops).astype(np.int64) if pattern_stops else np.empty(0, np.int64),
+        pattern_stop_start=pattern_stop_start,
+        pattern_trips=np.array(pattern_trips, dtype=np.int64),
+        arrivals=np.concatenate(arrivals).astype(np.int32) if arrivals else np.empty(0, np.int32),
+        departures=np.concatenate(departures).astype(np.int32) if departures else np.empty(0, np.int32),
+        pattern_time_start=pattern_time_start,
+        max_walk=max_walk,
+        walk_speed=walk_speed,
+    )
+    print(f"Loaded {timetable} for {service_date} in {time.perf_counter() - started:.1f} s")
+    return timetable
+
+
+class RaptorRouter:
+    """Earliest-arrival RAPTOR queries on a Timetable."""
+
+    def __init__(self, timetable, max_rounds=MAX_ROUNDS):
+        self.timetable = timetable
+        self.max_rounds = max_rounds
+
+    def scan_pattern(self, pattern, ready, best):
+        """Ride every trip of one pattern that can be boarded by the times in ready, improving best."""
+        t = self.timetable
+        stops = t.pattern_stops[t.pattern_stop_start[pattern]:t.pattern_stop_start[pattern + 1]]
+        n_trips = t.pattern_trips[pattern]
+        times = slice(t.pattern_time_start[pattern], t.pattern_time_start[pattern + 1])
+        departures = t.departures[times].reshape(n_trips, len(stops))
+        arrivals = t.arrivals[times].reshape(n_trips, len(stops))
+
+        # Earliest trip catchable at each stop; columns are sorted, so counting earlier departures finds it
+        catchable = (departures < ready[stops]).sum(axis=0)
+        # At each stop, ride the earliest trip boarded at any previous stop of the pattern
+        boarded = np.minimum.accumulate(catchable)
+        riding = np.r_[n_trips, boarded[:-1]]
+        reached = np.flatnonzero(riding < n_trips)
+        if len(reached):
+            np.minimum.at(best, stops[reached], arrivals[riding[reached], reached])
+
+    def earliest_arrivals(self, access_stops, access_times):
+        """Earliest arrival time (seconds after midnight) at every stop, given arrival times at the access stops."""
+        t = self.timetable
+        best = np.full(len(t.stop_ids), UNREACHED, dtype=np.int32)
+        np.minimum.at(best, access_stops, access_times)
+        marked = np.unique(access_stops)
+
+        for _ in range(self.max_rounds):
+            if len(marked) == 0:
+                break
+            ready = best.copy()
+            for pattern in t.patterns_at(marked):
+                self.scan_pattern(pattern, ready, best)
+            improved = np.flatnonzero(best < ready)
+
+            # Walk from every stop reached by vehicle this round to its neighbours
+            rows = csr_rows(t.transfer_start, improved)
+            walked = best[np.repeat(improved, np.diff(t.transfer_start)[improved])] + t.transfer_walk[rows]
+            before = best.copy()
+            np.minimum.at(best, t.transfer_to[rows], walked)
+            marked = np.union1d(improved, np.flatnonzero(best < before))
+
+        return best
+
+    def travel_times(self, access_stops, access_walk, departure, egress, direct_walk=None):
+        """
+        Travel times in minutes (NaN if unreachable) to every destination, leaving at
+        departure seconds after midnight and walking access_walk seconds to access_stops.
+        egress holds CSR walk links (offsets, stops, walk seconds) of the destinations,
+        e.g. AccessLinks.point_links(); direct_walk, if given, is the time in seconds
+        to walk straight to each destination (inf where it is too far).
+        """
+        best = self.earliest_arrivals(access_stops, departure + access_walk)
+
+        offsets, egress_stops, egress_walk = egress
+        arrival = best[egress_stops].astype(np.int64) + egress_walk
+        arrival[best[egress_stops] == UNREACHED] = UNREACHED
+        destination = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        earliest = np.full(len(offsets) - 1, UNREACHED, dtype=np.int64)
+        np.minimum.at(earliest, destination, arrival)
+
+        if direct_walk is not None:
+            on_foot = np.isfinite(direct_walk)
+            earliest[on_foot] = np.minimum(earliest[on_foot], departure + direct_walk[on_foot])
+
+        minutes = (earliest - departure) / 60
+        minutes[earliest == UNREACHED] = np.nan
+        return minutes.astype(np.float32)
+
+
+_worker = {}
+
+
+def _init_worker(timetable, max_rounds, links, xy, departure):
+    _worker['router'] = RaptorRouter(timetable, max_rounds)
+    _worker['links'] = links
+    _worker['xy'] = xy
+    _worker['departure'] = departure
+
+
+def _matrix_row(origin):
+    router, (offsets, stops, walk), xy = _worker['router'], _worker['links'], _worker['xy']
+    access = slice(offsets[origin], offsets[origin + 1])
+    distance = np.linalg.norm(xy - xy[origin], axis=1)
+    t = router.timetable
+    direct_walk = np.where(distance <= t.max_walk, distance / t.walk_speed, np.inf)
+    return router.travel_times(stops[access], walk[access], _worker['departure'], _worker['links'], direct_walk)
+
+
+def compute_matrix(timetable, links, lat, lon, departure, workers=None, max_rounds=MAX_ROUNDS):
+    """
+    Travel time matrix in minutes between all points, one RAPTOR query per origin on
+    worker processes. links are the points' walk links to the timetable's stops, as
+    returned by Timetable.walk_links or AccessLinks.point_links.
+    """
+    xy = to_metres(lat, lon, timetable.lat0)
+    matrix = np.full((len(lat), len(lat)), np.nan, dtype=np.float32)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(timetable, max_rounds, links, xy, departure)) as pool:
+        for origin, row in enumerate(pool.map(_matrix_row, range(len(lat)), chunksize=8)):
+            matrix[origin] = row
+            if (origin + 1) % 100 == 0 or origin + 1 == len(lat):
+                elapsed = time.perf_counter() - started
+                print(f"{origin + 1}/{len(lat)} origins done, {(origin + 1) / elapsed:.1f} origins/s")
+    return matrix
+
+
+def main():
+    from TravelTimes import MAX_ATTEMPTS, OUTPUT_DIR, POINT_SEED, ZONES_PATH
+    import geopandas as gpd
+    from ZonePoints import load_zone_points
+
+    parser = argparse.ArgumentParser(description="Compute the TAZ_1270 transit matrix in-process with RAPTOR.")
+    parser.add_argument('--gtfs', required=True, help="GTFS directory cleaned by Clean-Israel-GTFS.py")
+    parser.add_argument('--date', default=datetime.now().strftime("%Y-%m-%d"), help="service date, YYYY-MM-DD")
+    parser.add_argument('--time', default="07:30", help="departure time, HH:MM")
+    parser.add_argument('--zones', default=ZONES_PATH)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--max-rounds', type=int, default=MAX_ROUNDS, help="vehicles per journey")
+    parser.add_argument('--max-walk', type=float, default=MAX_WALK, help="longest walk in metres")
+    args = parser.parse_args()
+
+    departure_time = datetime.strptime(f"{args.date} {args.time}", "%Y-%m-%d %H:%M")
+    os.makedirs(args.output_dir, exist_ok=True)
+    timetable = load_timetable(args.gtfs, departure_time.date(), max_walk=args.max_walk)
+
+    zones = gpd.read_file(args.zones).to_crs(epsg=4326)
+    zone_points = load_zone_points(zones, args.output_dir, MAX_ATTEMPTS, POINT_SEED)
+    taz = zones['TAZ_1270'].to_numpy()
+    lat, lon = np.array([zone_points.first(zone) for zone in taz]).T
+    access_links = load_access_links(args.gtfs, zone_points, args.output_dir, args.max_walk)
+    if not np.array_equal(access_links.stop_ids, timetable.stop_ids.astype(str)):
+        raise ValueError("Access links and timetable were built from different stops.txt files")
+
+    departure = departure_time.hour * 3600 + departure_time.minute * 60
+    matrix = compute_matrix(timetable, access_links.point_links(), lat, lon, departure,
+                            args.workers, args.max_rounds)
+
+    filepath = os.path.join(args.output_dir, "od_matrix_TRANSIT_raptor.npz")
+    np.savez_compressed(filepath, travel_time=matrix, origins=taz, destinations=taz)
+    print(f"Transit matrix saved to {filepath}, {np.count_nonzero(~np.isnan(matrix))} valid times")
+
+
+if __name__ == "__main__":
+    main()
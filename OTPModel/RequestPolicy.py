@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+How OTPClient reacts to the outcome of a request.
+
+Every plan ends in one of four outcomes:
+    OK         a travel time was found
+    NO_ROUTE   OTP answered but found no itinerary; try another point in the zone
+    TRANSIENT  timeout, connection error, HTTP 429/5xx or a plan-level error;
+               the server is busy, so retry the same point after a backoff
+    FATAL      any other HTTP 4xx or a rejected query; retrying will not help
+
+Overload (TRANSIENT outcomes, or latency well above the best seen) makes
+AdaptiveLimiter halve the number of requests in flight; every request that
+completes normally adds back a fraction of one slot (AIMD).
+"""
+
+import random
+import threading
+import time
+
+import requests
+
+OK = 'ok'
+NO_ROUTE = 'no_route'
+TRANSIENT = 'transient'
+FATAL = 'fatal'
+
+
+def classify_response(response):
+    """Return None for a usable HTTP 200 response, otherwise the outcome of all of its plans."""
+    if response.status_code == 200:
+        return None
+    if response.status_code == 429 or response.status_code >= 500:
+        return TRANSIENT
+    return FATAL
+
+
+def classify_exception(exception):
+    """Outcome of all plans of a request that raised instead of returning a response."""
+    if isinstance(exception, (requests.Timeout, requests.ConnectionError, ValueError)):
+        # ValueError covers a truncated or garbled JSON body from a struggling server
+        return TRANSIENT
+    return FATAL
+
+
+def backoff_delay(retry, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter for the given retry number (0 for the first retry)."""
+    return random.uniform(0, min(cap, base * 2 ** retry))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of OTP requests in flight.
+
+    The limit starts at max_limit. A request that ends in overload (a
+    TRANSIENT outcome, or a latency above latency_factor times the smoothed
+    best latency seen so far) halves it, at most once per decrease_interval
+    seconds so that one burst of slow responses counts once. Every other
+    completed request raises it by 1 / limit, i.e. about one slot per round
+    of requests, up to max_limit.
+    """
+
+    def __init__(self, max_limit, min_limit=1, latency_factor=3.0, decrease_interval=1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.latency_factor = latency_factor
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self.best_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, elapsed, overloaded):
+        with self._condition:
+            self.in_flight -= 1
+            if not overloaded:
+                if self.best_latency is None or elapsed < self.best_latency:
+                    self.best_latency = elapsed
+                else:
+                    # Drift slowly upwards so one lucky request does not set the bar forever
+                    self.best_latency += 0.01 * (elapsed - self.best_latency)
+                overloaded = elapsed > self.latency_factor * self.best_latency
+
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Car travel times on the OSM road network without OTP.
+
+read_osm_roads reads the drivable highways from the same Geofabrik extract
+OTP is built from (needs the osmium package), build_road_graph turns them
+into a CSR matrix of travel times in seconds between road nodes, keeping the
+largest strongly connected part of the network, and compute_car_matrix runs
+scipy's Dijkstra from every zone's snapped node in chunks on worker
+processes. The graph is cached as an .npz next to the output so later runs
+skip parsing the extract.
+
+Speeds come from the maxspeed tag when it is a number, otherwise from
+ROAD_SPEEDS by highway type; there are no turn costs or congestion, so the
+times are free-flow times between the road nodes closest to each zone point.
+
+Example:
+    python RoadGraph.py --osm israel-and-palestine-latest.osm.pbf --workers 8
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+
+from AccessLinks import to_metres
+
+# Default free-flow speeds in km/h by OSM highway type; other highway types are not drivable
+ROAD_SPEEDS = {
+    'motorway': 100, 'motorway_link': 60,
+    'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 40,
+    'tertiary': 40, 'tertiary_link': 30,
+    'unclassified': 30, 'residential': 30, 'road': 30,
+    'living_street': 10, 'service': 20,
+}
+
+# Origins per Dijkstra call; each call holds an origins x road nodes float64 array
+ORIGIN_CHUNK = 32
+
+EARTH_RADIUS = 6371000
+
+
+def way_speed(tags):
+    """Speed in km/h for a way's tags, or None if cars may not use it."""
+    highway = tags.get('highway')
+    if highway not in ROAD_SPEEDS:
+        return None
+    if tags.get('access') in ('no', 'private') or tags.get('motor_vehicle') == 'no' or tags.get('area') == 'yes':
+        return None
+    maxspeed = tags.get('maxspeed', '')
+    return float(maxspeed) if maxspeed.isdigit() else ROAD_SPEEDS[highway]
+
+
+def way_direction(tags):
+    """1 for one-way along the node order, -1 for one-way against it, 0 for two-way."""
+    oneway = tags.get('oneway')
+    if oneway in ('yes', '1', 'true'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway != 'no' and (tags.get('highway') == 'motorway' or tags.get('junction') == 'roundabout'):
+        return 1
+    return 0
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def read_osm_roads(osm_path):
+    """
+    Read the drivable ways of an OSM extract.
+
+    Returns (node_ids, lat, lon, way_start, speed, direction): the node
+    references of all ways concatenated with their coordinates, the offset of
+    each way's first node, and each way's speed (km/h) and direction.
+    """
+    import osmium
+
+    class RoadHandler(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.node_ids, self.lat, self.lon = [], [], []
+            self.lengths, self.speed, self.direction = [], [], []
+
+        def way(self, w):
+            tags = {tag.k: tag.v for tag in w.tags}
+            speed = way_speed(tags)
+            if speed is None or len(w.nodes) < 2:
+                return
+            nodes = [(n.ref, n.location.lat, n.location.lon) for n in w.nodes if n.location.valid()]
+            if len(nodes) < 2:
+                return
+            for ref, lat, lon in nodes:
+                self.node_ids.append(ref)
+                self.lat.append(lat)
+                self.lon.append(lon)
+            self.lengths.append(len(nodes))
+            self.speed.append(speed)
+            self.direction.append(way_direction(tags))
+
+    handler = RoadHandler()
+    handler.apply_file(osm_path, locations=True)
+    way_start = np.zeros(len(handler.lengths) + 1, dtype=np.int64)
+    np.cumsum(handler.lengths, out=way_start[1:])
+    return (np.array(handler.node_ids, dtype=np.int64), np.array(handler.lat), np.array(handler.lon),
+            way_start, np.array(handler.speed, dtype=np.float64), np.array(handler.direction, dtype=np.int8))
+
+
+class RoadGraph:
+    """Directed road graph: graph[u, v] is the free-flow driving time in seconds from node u to v."""
+
+    def __init__(self, node_lat, node_lon, graph):
+        self.node_lat = node_lat
+        self.node_lon = node_lon
+        self.graph = graph
+        self.lat0 = float(np.mean(node_lat)) if len(node_lat) else 0.0
+        self._tree = None
+
+    def __repr__(self):
+        return f"RoadGraph({len(self.node_lat)} nodes, {self.graph.nnz} edges)"
+
+    def snap(self, lat, lon):
+        """Index of the road node nearest to each point, and the straight-line gap in metres."""
+        if self._tree is None:
+            self._tree = cKDTree(to_metres(self.node_lat, self.node_lon, self.lat0))
+        distance, nodes = self._tree.query(to_metres(lat, lon, self.lat0))
+        return nodes, distance
+
+    def save(self, path, source_hash):
+        np.savez(path, node_lat=self.node_lat, node_lon=self.node_lon, indptr=self.graph.indptr,
+                 indices=self.graph.indices, data=self.graph.data, source_hash=source_hash)
+
+    @classmethod
+    def load(cls, cached):
+        n = len(cached['node_lat'])
+        graph = csr_matrix((cached['data'], cached['indices'], cached['indptr']), shape=(n, n))
+        return cls(cached['node_lat'], cached['node_lon'], graph)
+
+
+def build_road_graph(node_ids, lat, lon, way_start, speed, direction):
+    """Build a RoadGraph from the output of read_osm_roads."""
+    unique_ids, node = np.unique(node_ids, return_inverse=True)
+    node_lat = np.zeros(len(unique_ids))
+    node_lon = np.zeros(len(unique_ids))
+    node_lat[node] = lat
+    node_lon[node] = lon
+
+    # One edge between consecutive nodes of each way, except across the end of a way
+    way_of = np.repeat(np.arange(len(speed)), np.diff(way_start))
+    same_way = way_of[1:] == way_of[:-1]
+    u, v = node[:-1][same_way], node[1:][same_way]
+    way = way_of[:-1][same_way]
+    seconds = haversine(lat[:-1][same_way], lon[:-1][same_way], lat[1:][same_way], lon[1:][same_way]) \
+        / (speed[way] / 3.6)
+
+    forward = direction[way] >= 0
+    backward = direction[way] <= 0
+    sources = np.concatenate([u[forward], v[backward]])
+    targets = np.concatenate([v[forward], u[backward]])
+    seconds = np.concatenate([seconds[forward], seconds[backward]])
+
+    # Keep the fastest of parallel edges (csr_matrix would add them up)
+    order = np.lexsort((seconds, targets, sources))
+    sources, targets, seconds = sources[order], targets[order], seconds[order]
+    first = np.r_[True, (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])]
+    sources, targets, seconds = sources[first], targets[first], np.maximum(seconds[first], 0.01)
+
+    n = len(unique_ids)
+    graph = csr_matrix((seconds, (sources, targets)), shape=(n, n))
+
+    # Zones snapped to a disconnected fragment (e.g. a gated compound) would have no routes
+    _, component = connected_components(graph, directed=True, connection='strong')
+    keep = np.flatnonzero(component == np.bincount(component).argmax())
+    return RoadGraph(node_lat[keep], node_lon[keep], graph[keep][:, keep].tocsr())
+
+
+def source_hash(osm_path):
+    """Identify an OSM extract by name, size and modification time, to detect a stale cached graph."""
+    stat = os.stat(osm_path)
+    return hashlib.sha1(f"{os.path.basename(osm_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+
+def load_road_graph(osm_path, cache_dir):
+    """Load the cached road graph for an OSM extract, building and caching it if needed."""
+    name = os.path.basename(osm_path).split('.')[0]
+    path = os.path.join(cache_dir, f"road_graph_{name}.npz")
+    osm_hash = source_hash(osm_path)
+
+    if os.path.exists(path):
+        cached = np.load(path)
+        if str(cached['source_hash']) == osm_hash:
+            return RoadGraph.load(cached)
+        print(f"OSM extract changed, rebuilding {path}")
+
+    started = time.perf_counter()
+    graph = build_road_graph(*read_osm_roads(osm_path))
+    graph.save(path, osm_hash)
+    print(f"Built {graph} in {time.perf_counter() - started:.0f} s, saved to {path}")
+    return graph
+
+
+_worker = {}
+
+
+def _init_worker(graph, nodes):
+    _worker['graph'] = graph.graph
+    _worker['nodes'] = nodes
+
+
+def _matrix_rows(origins):
+    seconds = dijkstra(_worker['graph'], directed=True, indices=_worker['nodes'][origins])
+    return seconds[:, _worker['nodes']]
+
+
+def compute_car_matrix(graph, lat, lon, workers=None, chunk=ORIGIN_CHUNK):
+    """Driving time matrix in minutes (NaN if unreachable) between the road nodes nearest to the points."""
+    nodes, gap = graph.snap(lat, lon)
+    if gap.max() > 1000:
+        print(f"Warning: {np.count_nonzero(gap > 1000)} points are more than 1 km from the nearest road")
+
+    chunks = [np.arange(start, min(start + chunk, len(nodes))) for start in range(0, len(nodes), chunk)]
+    matrix = np.full((len(nodes), len(nodes)), np.nan, dtype=np.float32)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(graph, nodes)) as pool:
+        for origins, seconds in zip(chunks, pool.map(_matrix_rows, chunks)):
+            matrix[origins] = np.where(np.isinf(seconds), np.nan, seconds / 60)
+            done = origins[-1] + 1
+            print(f"{done}/{len(nodes)} origins done, {done / (time.perf_counter() - started):.1f} origins/s")
+    return matrix
+
+
+def main():
+    from TravelTimes import MAX_ATTEMPTS, OUTPUT_DIR, POINT_SEED, ZONES_PATH
+    import geopandas as gpd
+    from ZonePoints import load_zone_points
+
+    parser = argparse.ArgumentParser(description="Compute the TAZ_1270 car matrix on the OSM road network.")
+    parser.add_argument('--osm', required=True, help="OSM extract (.osm.pbf), e.g. the Geofabrik Israel file")
+    parser.add_argument('--zones', default=ZONES_PATH)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    graph = load_road_graph(args.osm, args.output_dir)
+
+    zones = gpd.read_file(args.zones).to_crs(epsg=4326)
+    zone_points = load_zone_points(zones, args.output_dir, MAX_ATTEMPTS, POINT_SEED)
+    taz = zones['TAZ_1270'].to_numpy()
+    lat, lon = np.array([zone_points.first(zone) for zone in taz]).T
+
+    matrix = compute_car_matrix(graph, lat, lon, args.workers)
+
+    filepath = os.path.join(args.output_dir, "od_matrix_AUTO_osm.npz")
+    np.savez_compressed(filepath, travel_time=matrix, origins=taz, destinations=taz)
+    print(f"Car matrix saved to {filepath}, {np.count_nonzero(~np.isnan(matrix))} valid times")
+
+
+if __name__ == "__main__":
+    main()
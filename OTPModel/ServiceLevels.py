@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transit service levels per TAZ_1270 zone and hour of the day.
+
+Stops are joined to the zone polygons once through geopandas' spatial index,
+then stop_times.txt is streamed in chunks, keeping only the trips running on
+the service date. For every zone and hour h0..h23 (the hour columns of the
+cellular trip tables) it counts:
+
+- departures: vehicle departures from stops in the zone
+- trips: trips serving the zone, each counted once at its first departure there
+- routes: distinct routes serving the zone
+- mean_headway, max_headway: mean and largest gap in minutes between a trip
+  serving the zone in that hour and the next trip serving it (the next one
+  may leave in a later hour, so an hourly service still has a headway)
+- expected_wait: mean wait in minutes of a passenger arriving at a random
+  time in the hour, sum(gap^2) / (2 * sum(gap)); it equals half the mean
+  headway for an even service and grows with bunching and gaps
+- best_route_headway: smallest mean headway of a single route in the zone
+
+Headways come from the sorted times at which each trip first leaves the
+zone. The stop_times rows themselves are not kept between chunks, only one
+(zone, time, route) entry per trip and zone served, so memory stays bounded
+on the national feed. Departures after midnight (GTFS hours 24 and later)
+count in the early hours h0, h1, ... of the same day; their gaps are taken
+in service-day order. Trips are assumed to be written row after row in
+stop_times.txt, as GTFS feeds normally are.
+
+Example:
+    python ServiceLevels.py --gtfs /path/to/gtfs --date 2024-09-01
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from AccessLinks import read_stops
+from RaptorRouter import STOP_TIMES_CHUNK, active_service_ids, parse_gtfs_times
+
+HOURS = 24
+HOUR_COLUMNS = [f'h{i}' for i in range(HOURS)]
+INDICATORS = ['departures', 'trips', 'routes', 'mean_headway', 'max_headway', 'expected_wait', 'best_route_headway']
+
+
+class ServiceLevels:
+    """Zone x hour arrays of service indicators, with rows in the order of taz."""
+
+    def __init__(self, taz, departures, trips, routes, mean_headway, max_headway, expected_wait,
+                 best_route_headway):
+        self.taz = np.asarray(taz)
+        self.departures = departures
+        self.trips = trips
+        self.routes = routes
+        self.mean_headway = mean_headway
+        self.max_headway = max_headway
+        self.expected_wait = expected_wait
+        self.best_route_headway = best_route_headway
+
+    def __repr__(self):
+        return f"ServiceLevels({len(self.taz)} zones, {int(self.departures.sum())} departures)"
+
+    def to_frame(self, indicator):
+        """One indicator as a DataFrame with a TAZ_1270 column and h0..h23, like the trip tables."""
+        table = pd.DataFrame(getattr(self, indicator), columns=HOUR_COLUMNS)
+        table.insert(0, 'TAZ_1270', self.taz)
+        return table
+
+    def save(self, path):
+        np.savez_compressed(path, taz=self.taz, **{name: getattr(self, name) for name in INDICATORS})
+
+
+def stop_zones(stops, zones):
+    """Index into zones of the polygon containing each stop, -1 for stops outside every zone."""
+    import geopandas as gpd
+
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(stops['stop_lon'], stops['stop_lat']), crs='EPSG:4326')
+    polygons = zones[['geometry']].to_crs(epsg=4326).reset_index(drop=True)
+    joined = gpd.sjoin(points, polygons, how='inner', predicate='within')
+    # A stop on a shared boundary falls in both zones; keep one
+    joined = joined[~joined.index.duplicated()]
+    zone = np.full(len(stops), -1, dtype=np.int32)
+    zone[joined.index.to_numpy()] = joined['index_right'].to_numpy()
+    return zone
+
+
+def headway_gaps(group, seconds, cell):
+    """
+    Gaps in minutes between consecutive departures of each group (e.g. a zone),
+    with the cell of the departure that starts each gap.
+    """
+    order = np.lexsort((seconds, group))
+    group, seconds, cell = group[order], seconds[order], cell[order]
+    same = group[1:] == group[:-1]
+    return (seconds[1:] - seconds[:-1])[same] / 60, cell[:-1][same]
+
+
+def compute_service_levels(gtfs_dir, zones, service_date, chunk=STOP_TIMES_CHUNK):
+    """Stream stop_times.txt for the trips running on service_date into ServiceLevels per zone of zones."""
+    started = time.perf_counter()
+    stops = read_stops(gtfs_dir)
+    stop_index = pd.Index(stops['stop_id'])
+    zone_of_stop = stop_zones(stops, zones)
+    n_zones = len(zones)
+
+    services = active_service_ids(gtfs_dir, service_date)
+    trips = pd.read_csv(os.path.join(gtfs_dir, 'trips.txt'), usecols=['trip_id', 'route_id', 'service_id'],
+                        dtype=str)
+    trips = trips[trips['service_id'].isin(services)]
+    trip_index = pd.Index(trips['trip_id'])
+    trip_route, route_ids = pd.factorize(trips['route_id'])
+    n_routes = max(len(route_ids), 1)
+
+    departures = np.zeros(n_zones * HOURS, dtype=np.int64)
+    # First departure of every trip from every zone it serves, as (zone, seconds, route) arrays
+    visited = []
+    pending = pd.DataFrame({'trip': [], 'zone': [], 'seconds': []}, dtype=np.int64)
+
+    def count_visits(visits):
+        """Keep (trip, zone, first departure) visits."""
+        visited.append((visits['zone'].to_numpy(np.int32), visits['seconds'].to_numpy(np.int32),
+                        trip_route[visits['trip'].to_numpy()].astype(np.int32)))
+
+    columns = ['trip_id', 'departure_time', 'stop_id']
+    for part in pd.read_csv(os.path.join(gtfs_dir, 'stop_times.txt'), usecols=columns, dtype=str,
+                            chunksize=chunk):
+        part = part.dropna(subset=['departure_time'])
+        trip = trip_index.get_indexer(part['trip_id'])
+        stop = stop_index.get_indexer(part['stop_id'])
+        zone = np.where(stop >= 0, zone_of_stop[stop], -1)
+        keep = (trip >= 0) & (zone >= 0)
+        if not keep.any():
+            continue
+        seconds = parse_gtfs_times(part.loc[keep, 'departure_time'])
+        np.add.at(departures, zone[keep] * HOURS + seconds // 3600 % HOURS, 1)
+
+        visits = pd.concat([pending, pd.DataFrame({'trip': trip[keep], 'zone': zone[keep], 'seconds': seconds})])
+        visits = visits.groupby(['trip', 'zone'], as_index=False)['seconds'].min()
+        # The last trip of the chunk may continue in the next one
+        last = visits['trip'] == trip[keep][-1]
+        pending = visits[last]
+        count_visits(visits[~last])
+    count_visits(pending)
+
+    zone, seconds, route = (np.concatenate(column).astype(np.int64) for column in zip(*visited))
+    n_cells = n_zones * HOURS
+    cell = zone * HOURS + seconds // 3600 % HOURS
+    trip_counts = np.bincount(cell, minlength=n_cells)
+    route_counts = np.bincount(np.unique(cell * n_routes + route) // n_routes, minlength=n_cells)
+
+    gaps, gap_cell = headway_gaps(zone, seconds, cell)
+    gap_counts = np.bincount(gap_cell, minlength=n_cells)
+    gap_sums = np.bincount(gap_cell, weights=gaps, minlength=n_cells)
+    max_headway = np.full(n_cells, -np.inf)
+    np.maximum.at(max_headway, gap_cell, gaps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_headway = gap_sums / gap_counts
+        expected_wait = np.bincount(gap_cell, weights=gaps ** 2, minlength=n_cells) / (2 * gap_sums)
+    # Gaps of zero (trips leaving together) give no wait
+    expected_wait[(gap_counts > 0) & (gap_sums == 0)] = 0
+    max_headway[gap_counts == 0] = np.nan
+
+    # Mean headway per (zone, hour, route), then the best route of each zone and hour
+    route_gaps, route_gap_cell = headway_gaps(zone * n_routes + route, seconds, cell * n_routes + route)
+    route_cells, route_gap_cell = np.unique(route_gap_cell, return_inverse=True)
+    route_headway = (np.bincount(route_gap_cell, weights=route_gaps) / np.bincount(route_gap_cell))
+    best_route_headway = np.full(n_cells, np.inf)
+    np.minimum.at(best_route_headway, route_cells // n_routes, route_headway)
+    best_route_headway[np.isinf(best_route_headway)] = np.nan
+
+    shape = (n_zones, HOURS)
+    levels = ServiceLevels(zones['TAZ_1270'].to_numpy(), departures.reshape(shape).astype(np.int32),
+                           trip_counts.reshape(shape).astype(np.int32), route_counts.reshape(shape).astype(np.int32),
+                           *(values.reshape(shape).astype(np.float32)
+                             for values in (mean_headway, max_headway, expected_wait, best_route_headway)))
+    print(f"Computed {levels} for {service_date} in {time.perf_counter() - started:.1f} s")
+    return levels
+
+
+def main():
+    from TravelTimes import OUTPUT_DIR, ZONES_PATH
+    import geopandas as gpd
+
+    parser = argparse.ArgumentParser(description="Compute transit service levels per TAZ_1270 zone and hour.")
+    parser.add_argument('--gtfs', required=True, help="GTFS directory cleaned by Clean-Israel-GTFS.py")
+    parser.add_argument('--date', default=datetime.now().strftime("%Y-%m-%d"), help="service date, YYYY-MM-DD")
+    parser.add_argument('--zones', default=ZONES_PATH)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    zones = gpd.read_file(args.zones)
+    service_date = datetime.strptime(args.date, "%Y-%m-%d").date()
+    levels = compute_service_levels(args.gtfs, zones, service_date)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    filepath = os.path.join(args.output_dir, f"service_levels_{service_date:%Y%m%d}.npz")
+    levels.save(filepath)
+    table = pd.concat([levels.to_frame(name).assign(Indicator=name) for name in INDICATORS], ignore_index=True)
+    table = table[['TAZ_1270', 'Indicator'] + HOUR_COLUMNS]
+    table.to_csv(filepath.replace('.npz', '.csv'), index=False)
+    print(f"Service levels saved to {filepath} and {filepath.replace('.npz', '.csv')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic GTFS feeds shaped like the Israel MOT feed.
+
+generate_feed writes a schema-valid feed of a chosen size in stop_times.txt
+rows, with the quirks Clean-Israel-GTFS.py exists for: route_type 8 and
+715, location_type 1-4 and a 5-column translations.txt with a header OTP
+does not accept, some blank fields and some rows with an extra field. Stops
+are spread over Israel's extent and the services run through 2024 (one
+Sunday to Thursday, one on Fridays), so the feed also works for pruning and
+routing. Large feeds are written in chunks, so a 20M-row stop_times.txt
+does not need 20M rows in memory.
+
+Example:
+    python SyntheticGTFS.py --rows 1000000 --output /tmp/gtfs-1m --zip
+"""
+
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+STOPS_PER_TRIP = 40
+TRIPS_PER_ROUTE = 50
+SHAPE_POINTS_PER_ROUTE = 200
+
+# Trips are generated and written this many at a time
+TRIP_CHUNK = 25_000
+
+# Share of MOT route types: buses as 3 and as 8, rail as 2 and as 715, light rail as 0
+ROUTE_TYPES = (['3', '8', '2', '715', '0'], [0.7, 0.2, 0.03, 0.04, 0.03])
+LOCATION_TYPES = (['0', '1', '2', '3', '4'], [0.9, 0.04, 0.03, 0.02, 0.01])
+
+
+def write_table(directory, filename, table):
+    table.to_csv(os.path.join(directory, filename), index=False)
+
+
+def generate_feed(directory, stop_times_rows, seed=0):
+    """Write a synthetic feed with about stop_times_rows rows in stop_times.txt; return the row counts per file."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    n_trips = max(1, stop_times_rows // STOPS_PER_TRIP)
+    n_routes = max(1, n_trips // TRIPS_PER_ROUTE)
+    n_stops = max(STOPS_PER_TRIP, min(50_000, stop_times_rows // 400))
+
+    write_table(directory, 'agency.txt', pd.DataFrame({
+        'agency_id': ['1', '2', '3'], 'agency_name': ['Egged', 'Dan', 'Israel Railways'],
+        'agency_url': 'http://www.gov.il', 'agency_timezone': 'Asia/Jerusalem', 'agency_lang': 'he'}))
+
+    stop_ids = np.arange(1, n_stops + 1)
+    write_table(directory, 'stops.txt', pd.DataFrame({
+        'stop_id': stop_ids, 'stop_code': stop_ids + 10000, 'stop_name': [f"Stop {i}" for i in stop_ids],
+        'stop_desc': '', 'stop_lat': rng.uniform(29.6, 33.2, n_stops).round(6),
+        'stop_lon': rng.uniform(34.3, 35.7, n_stops).round(6),
+        'location_type': rng.choice(LOCATION_TYPES[0], n_stops, p=LOCATION_TYPES[1]),
+        'parent_station': '', 'zone_id': rng.integers(1, 100, n_stops)}))
+
+    route_ids = np.arange(1, n_routes + 1)
+    write_table(directory, 'routes.txt', pd.DataFrame({
+        'route_id': route_ids, 'agency_id': rng.integers(1, 4, n_routes),
+        'route_short_name': rng.integers(1, 500, n_routes), 'route_long_name': [f"Route {i}" for i in route_ids],
+        'route_desc': [f"{i}-1-#" for i in route_ids],
+        'route_type': rng.choice(ROUTE_TYPES[0], n_routes, p=ROUTE_TYPES[1]), 'route_color': ''}))
+
+    write_table(directory, 'calendar.txt', pd.DataFrame({
+        'service_id': ['1', '2'], 'sunday': [1, 0], 'monday': [1, 0], 'tuesday': [1, 0], 'wednesday': [1, 0],
+        'thursday': [1, 0], 'friday': [0, 1], 'saturday': [0, 0],
+        'start_date': '20240101', 'end_date': '20241231'}))
+
+    shape_route = np.repeat(route_ids, SHAPE_POINTS_PER_ROUTE)
+    write_table(directory, 'shapes.txt', pd.DataFrame({
+        'shape_id': shape_route, 'shape_pt_lat': rng.uniform(29.6, 33.2, len(shape_route)).round(6),
+        'shape_pt_lon': rng.uniform(34.3, 35.7, len(shape_route)).round(6),
+        'shape_pt_sequence': np.tile(np.arange(1, SHAPE_POINTS_PER_ROUTE + 1), n_routes)}))
+
+    # 5 columns under a header OTP does not know, with blank fields and a few rows with an extra field
+    n_translations = n_stops + n_routes
+    translations = pd.DataFrame({
+        'trans_id': [f"Stop {i}" for i in stop_ids] + [f"Route {i}" for i in route_ids],
+        'table_name': ['stops'] * n_stops + ['routes'] * n_routes,
+        'field_value': '', 'lang': rng.choice(['EN', 'AR'], n_translations),
+        'translation': [f"Translated {i}" for i in range(n_translations)]})
+    translations.loc[rng.random(n_translations) < 0.01, 'translation'] = ' '
+    path = os.path.join(directory, 'translations.txt')
+    translations.to_csv(path, index=False)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("Extra,stops,,EN,with,extra field\n")
+
+    trip_path = os.path.join(directory, 'trips.txt')
+    stop_times_path = os.path.join(directory, 'stop_times.txt')
+    # Both are appended to chunk by chunk
+    for path in (trip_path, stop_times_path):
+        if os.path.exists(path):
+            os.remove(path)
+    for start in range(0, n_trips, TRIP_CHUNK):
+        trip_ids = np.arange(start + 1, min(start + TRIP_CHUNK, n_trips) + 1)
+        routes = (trip_ids - 1) % n_routes + 1
+        pd.DataFrame({'route_id': routes, 'service_id': np.where(trip_ids % 10 == 0, '2', '1'),
+                      'trip_id': trip_ids, 'trip_headsign': '', 'direction_id': trip_ids % 2,
+                      'shape_id': routes}).to_csv(trip_path, mode='a', index=False, header=start == 0)
+
+        n = len(trip_ids)
+        first_departure = rng.integers(5 * 3600, 23 * 3600, n)
+        hop = rng.integers(60, 180, (n, STOPS_PER_TRIP))
+        seconds = first_departure[:, None] + np.cumsum(hop, axis=1) - hop[:, :1]
+        times = pd.Series(seconds.ravel())
+        clock = ((times // 3600).astype(str).str.zfill(2) + ':' + (times // 60 % 60).astype(str).str.zfill(2)
+                 + ':' + (times % 60).astype(str).str.zfill(2))
+        pd.DataFrame({
+            'trip_id': np.repeat(trip_ids, STOPS_PER_TRIP), 'arrival_time': clock, 'departure_time': clock,
+            'stop_id': rng.integers(1, n_stops + 1, n * STOPS_PER_TRIP),
+            'stop_sequence': np.tile(np.arange(1, STOPS_PER_TRIP + 1), n),
+            'pickup_type': 0, 'drop_off_type': 0, 'shape_dist_traveled': ''
+        }).to_csv(stop_times_path, mode='a', index=False, header=start == 0)
+
+    return {'stops.txt': n_stops, 'routes.txt': n_routes, 'trips.txt': n_trips, 'translations.txt':
+            n_translations + 1, 'shapes.txt': len(shape_route), 'stop_times.txt': n_trips * STOPS_PER_TRIP}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic MOT-like GTFS feed.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="rows in stop_times.txt")
+    parser.add_argument('--output', required=True, help="directory to write the feed to")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--zip', action='store_true', help="also write <output>.zip")
+    args = parser.parse_args()
+
+    counts = generate_feed(args.output, args.rows, args.seed)
+    print(f"Wrote {args.output}: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+    if args.zip:
+        print(f"Wrote {shutil.make_archive(args.output, 'zip', args.output)}")
+
+
+if __name__ == "__main__":
+    main()
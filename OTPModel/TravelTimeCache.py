@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent SQLite cache of OTP travel times.
+
+Entries are keyed by the rounded origin and destination coordinates, the OTP
+mode, the departure date and time, and a graph version tag. Rebuilding the
+graph with a new GTFS feed only requires a new version tag; entries from older
+versions are simply never looked up again and can be dropped with purge().
+"""
+
+import sqlite3
+import threading
+
+# 5 decimal places is about 1 m, well below the size of any TAZ
+COORD_PRECISION = 5
+
+
+class TravelTimeCache:
+    """Thread-safe store of travel times in minutes."""
+
+    def __init__(self, path, version='default', commit_every=100):
+        self.path = path
+        self.version = version
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS travel_times (
+                from_lat INTEGER NOT NULL,
+                from_lon INTEGER NOT NULL,
+                to_lat INTEGER NOT NULL,
+                to_lon INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                departure TEXT NOT NULL,
+                version TEXT NOT NULL,
+                minutes REAL NOT NULL,
+                PRIMARY KEY (from_lat, from_lon, to_lat, to_lon, mode, departure, version)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def _key(self, from_lat, from_lon, to_lat, to_lon, mode, departure_time):
+        scale = 10 ** COORD_PRECISION
+        return (round(from_lat * scale), round(from_lon * scale),
+                round(to_lat * scale), round(to_lon * scale),
+                mode, departure_time.strftime("%Y-%m-%dT%H:%M:%S"), self.version)
+
+    def get(self, from_lat, from_lon, to_lat, to_lon, mode, departure_time):
+        """Return the cached travel time in minutes, or None if it is not cached."""
+        key = self._key(from_lat, from_lon, to_lat, to_lon, mode, departure_time)
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT minutes FROM travel_times
+                WHERE from_lat = ? AND from_lon = ? AND to_lat = ? AND to_lon = ?
+                  AND mode = ? AND departure = ? AND version = ?
+            """, key).fetchone()
+        return row[0] if row else None
+
+    def put(self, from_lat, from_lon, to_lat, to_lon, mode, departure_time, minutes):
+        key = self._key(from_lat, from_lon, to_lat, to_lon, mode, departure_time)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO travel_times VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               key + (minutes,))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._conn.commit()
+                self._uncommitted = 0
+
+    def purge(self, keep_version=None):
+        """Delete entries that do not belong to keep_version (default: this cache's version)."""
+        keep_version = self.version if keep_version is None else keep_version
+        with self._lock:
+            deleted = self._conn.execute('DELETE FROM travel_times WHERE version != ?',
+                                         (keep_version,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
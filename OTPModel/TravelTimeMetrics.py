@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentation for OTP travel time runs.
+
+RunMetrics is handed to OTPQueryEngine and records every HTTP request and
+every finished zone: latency histograms per mode and direction, outcome
+counts (no itinerary, transient and fatal failures, retries), how many
+candidate points each zone needed, and rolling requests/sec. Events are
+appended to a JSON-lines log as they happen and summary() gives the
+end-of-run totals.
+
+The summary's mean_concurrency (total request time / wall time) shows where
+the bottleneck is: close to the number of requests allowed in flight means
+the client keeps OTP busy and OTP is the limit; well below it means the
+client is not sending fast enough.
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+# Upper edges (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, 180000]
+
+# Window (seconds) over which the rolling request rate is measured
+RATE_WINDOW = 10.0
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed_ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile, capped at the slowest request."""
+        if self.count == 0:
+            return float('nan')
+        rank = np.ceil(q / 100 * self.count)
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(LATENCY_BUCKETS_MS[bucket], self.max_ms) if bucket < len(LATENCY_BUCKETS_MS) else self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else float('nan'),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms,
+            'buckets_ms': LATENCY_BUCKETS_MS,
+            'counts': self.counts,
+        }
+
+
+class RunMetrics:
+    """Thread-safe collector of request and zone statistics for one run."""
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.started = time.monotonic()
+        self.latency = {}
+        self.outcomes = Counter()
+        self.requests = 0
+        self.plans = 0
+        self.retries = 0
+        self.request_seconds = 0.0
+        self.points_needed = {}
+        self.zones_without_route = Counter()
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._log = open(log_path, 'a', encoding='utf-8') if log_path else None
+
+    def _write(self, event):
+        if self._log is not None:
+            event['t'] = round(time.time(), 3)
+            self._log.write(json.dumps(event) + '\n')
+
+    def _rate(self, now):
+        while self._recent and self._recent[0] < now - RATE_WINDOW:
+            self._recent.popleft()
+        window = min(RATE_WINDOW, now - self.started)
+        return len(self._recent) / window if window > 0 else 0.0
+
+    def record_request(self, url, mode, direction, elapsed, outcomes, retry):
+        """Record one HTTP request; outcomes holds the RequestPolicy outcome of each plan in it."""
+        now = time.monotonic()
+        key = (mode, direction)
+        with self._lock:
+            self.latency.setdefault(key, LatencyHistogram()).add(elapsed * 1000)
+            self.outcomes.update(outcomes)
+            self.requests += 1
+            self.plans += len(outcomes)
+            self.retries += len(outcomes) if retry else 0
+            self.request_seconds += elapsed
+            self._recent.append(now)
+            self._write({'event': 'request', 'url': url, 'mode': mode, 'direction': direction,
+                         'elapsed_ms': round(elapsed * 1000, 1), 'plans': len(outcomes),
+                         'outcomes': dict(Counter(outcomes)), 'retry': retry,
+                         'requests_per_s': round(self._rate(now), 2)})
+
+    def record_zone(self, mode, direction, taz, travel_time, attempts):
+        """Record a finished zone and how many candidate points it took."""
+        key = (mode, direction)
+        with self._lock:
+            if travel_time is not None:
+                self.points_needed.setdefault(key, Counter())[attempts] += 1
+            else:
+                self.zones_without_route[key] += 1
+            self._write({'event': 'zone', 'mode': mode, 'direction': direction, 'taz': int(taz),
+                         'travel_time': travel_time, 'attempts': attempts})
+
+    def requests_per_second(self):
+        with self._lock:
+            return self._rate(time.monotonic())
+
+    def summary(self):
+        with self._lock:
+            wall = time.monotonic() - self.started
+            return {
+                'wall_time_s': wall,
+                'requests': self.requests,
+                'plans': self.plans,
+                'retried_plans': self.retries,
+                'outcomes': dict(self.outcomes),
+                'requests_per_s': self.requests / wall if wall > 0 else 0.0,
+                'mean_concurrency': self.request_seconds / wall if wall > 0 else 0.0,
+                'latency': {f"{mode} {direction}": histogram.to_dict()
+                            for (mode, direction), histogram in self.latency.items()},
+                'points_needed': {f"{mode} {direction}": dict(sorted(counts.items()))
+                                  for (mode, direction), counts in self.points_needed.items()},
+                'zones_without_route': {f"{mode} {direction}": count
+                                        for (mode, direction), count in self.zones_without_route.items()},
+            }
+
+    def print_summary(self, max_in_flight=None):
+        summary = self.summary()
+        print(f"Run time: {summary['wall_time_s']:.1f} s, {summary['requests']} requests "
+              f"({summary['plans']} plans, {summary['retried_plans']} retried), "
+              f"{summary['requests_per_s']:.1f} requests/s")
+        print(f"Plan outcomes: {summary['outcomes']}")
+        for label, latency in summary['latency'].items():
+            print(f"  {label}: {latency['count']} requests, mean {latency['mean_ms']:.0f} ms, "
+                  f"p50 <= {latency['p50_ms']:.0f} ms, p95 <= {latency['p95_ms']:.0f} ms, "
+                  f"p99 <= {latency['p99_ms']:.0f} ms")
+        for label in summary['points_needed'].keys() | summary['zones_without_route'].keys():
+            print(f"  {label}: candidate points needed per zone {summary['points_needed'].get(label, {})}, "
+                  f"{summary['zones_without_route'].get(label, 0)} zones without a route")
+        concurrency = f"Mean requests in flight: {summary['mean_concurrency']:.1f}"
+        if max_in_flight:
+            concurrency += f" of {max_in_flight} allowed"
+        print(concurrency)
+        return summary
+
+    def close(self):
+        summary = self.summary()
+        with self._lock:
+            if self._log is not None:
+                self._write({'event': 'summary', **summary})
+                self._log.close()
+                self._log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
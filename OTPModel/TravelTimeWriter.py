@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Append-only writer for per-zone travel time results.
+
+Rows are buffered in preallocated NumPy arrays and appended to a CSV (or
+Parquet, by file extension) every flush_every rows, so memory stays flat.
+A CSV can be read while a long run is still going; a Parquet file becomes
+readable once the writer is closed.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class TravelTimeWriter:
+    """
+    Stream (zone, travel time, attempts, point index) rows to disk.
+
+    PointIndex is the position of the zone's candidate point that produced
+    the travel time (see ZonePoints), or -1 when no route was found, in which
+    case TravelTime is empty.
+    """
+
+    def __init__(self, path, flush_every=100):
+        self.path = path
+        self.flush_every = flush_every
+        self.rows_written = 0
+        self._taz = np.zeros(flush_every, dtype=np.int64)
+        self._travel_time = np.zeros(flush_every, dtype=np.float32)
+        self._attempts = np.zeros(flush_every, dtype=np.int16)
+        self._point_index = np.zeros(flush_every, dtype=np.int16)
+        self._size = 0
+        self._parquet = os.path.splitext(path)[1] == '.parquet'
+        self._parquet_writer = None
+
+        # Start a fresh file; rows are only ever appended after this
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, taz, travel_time, attempts, point_index):
+        i = self._size
+        self._taz[i] = taz
+        self._travel_time[i] = np.nan if travel_time is None else travel_time
+        self._attempts[i] = attempts
+        self._point_index[i] = point_index
+        self._size += 1
+        if self._size == self.flush_every:
+            self.flush()
+
+    def flush(self):
+        # An empty flush still creates the file (with a header) the first time
+        if self._size == 0 and (self.rows_written > 0 or os.path.exists(self.path)):
+            return
+        n = self._size
+        batch = pd.DataFrame({
+            'TAZ_1270': self._taz[:n],
+            'TravelTime': self._travel_time[:n],
+            'Attempts': self._attempts[:n],
+            'PointIndex': self._point_index[:n],
+        })
+
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            batch.to_csv(self.path, mode='a', header=self.rows_written == 0, index=False)
+
+        self.rows_written += n
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_travel_times(path):
+    """Read a file written by TravelTimeWriter (a CSV may still be being written)."""
+    if os.path.splitext(path)[1] == '.parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
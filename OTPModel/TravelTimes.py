@@ -6,14 +6,20 @@ Created on Tue Jul 23 14:55:05 2024
 @author: noamgal
 """
 
+import argparse
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-import shapely.geometry
-import requests
-from datetime import datetime
-import time
+from datetime import datetime, timedelta
 import os
-import random
+
+from GTFSManifest import feed_version
+from OTPClient import BATCH_SIZE, OTP_TIMEOUT, OTP_URL, OTPQueryEngine
+from RequestPolicy import OK, NO_ROUTE, TRANSIENT
+from TravelTimeCache import TravelTimeCache
+from TravelTimeMetrics import RunMetrics
+from TravelTimeWriter import TravelTimeWriter, read_travel_times
+from ZonePoints import build_zone_points, load_zone_points
 
 # To use this script, you must have built an OTP model stored locally with Israel's GTFS and OSM data
 # OTP Documentation: https://docs.opentripplanner.org/en/latest/
@@ -21,166 +27,355 @@ import random
 # GTFS Data can be downloaded here: https://gtfs.mot.gov.il/gtfsfiles/
 # OSM data can be downloaded here: https://download.geofabrik.de/asia/israel-and-palestine.html
 
-# the output of this 
-
-
-# Load TAZ zones shapefile
-zones = gpd.read_file('/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp')
-zones = zones.to_crs(epsg=4326)
-
-# OTP GTFS GraphQL local API endpoint
-OTP_URL = "http://localhost:8080/otp/routers/default/index/graphql"
-
-def get_travel_time(from_lat, from_lon, to_lat, to_lon, mode, departure_time):
-    query = """
-    query ($from: InputCoordinates!, $to: InputCoordinates!, $date: String!, $time: String!, $mode: Mode!) {
-      plan(
-        from: $from
-        to: $to
-        date: $date
-        time: $time
-        transportModes: [{mode: $mode}]
-      ) {
-        itineraries {
-          duration
-        }
-      }
-    }
+# The interactive mode writes one CSV per focus zone, direction and mode, with the travel time,
+# the number of attempts and the index of the candidate point that found a route for every zone.
+# The batch mode (--batch) writes a full origin x destination matrix per mode as a compressed .npz.
+
+ZONES_PATH = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp'
+OUTPUT_DIR = "/Users/noamgal/Downloads/NUR/celular1819_v1.3"
+
+# Number of OTP requests kept in flight; set this to about the number of cores OTP runs on
+MAX_IN_FLIGHT = 8
+
+# Travel times are cached between runs. Change GRAPH_VERSION whenever the OTP graph
+# is rebuilt (e.g. with a new GTFS feed) so old results are not reused, or pass
+# --feed-manifest to key the cache on the version of the cleaned feed instead.
+CACHE_FILENAME = "otp_travel_time_cache.sqlite"
+
+# Every OTP request and finished zone is appended to this JSON-lines log in the output directory
+METRICS_FILENAME = "otp_requests.jsonl"
+GRAPH_VERSION = "default"
+
+# Candidate query points per zone are cached next to the output; change the seed to draw a different set
+MAX_ATTEMPTS = 10
+# Rounds a zone may retry the same point after OTP failed to answer (on top of OTPClient's own retries)
+MAX_TRANSIENT_ROUNDS = 3
+POINT_SEED = 0
+
+# Departure windows (HH:MM) for the --sweep mode; to-focus trips in the morning, from-focus in the evening
+SWEEP_WINDOWS = {'to': ("07:00", "09:00"), 'from': ("16:00", "18:00")}
+SWEEP_STEP_MINUTES = 5
+SWEEP_PERCENTILES = (10, 90)
+
+
+def query_zones(engine, zone_points, zone_ids, focus_lat, focus_lon, mode, direction, departure_time):
     """
-    
-    variables = {
-        "from": {"lat": from_lat, "lon": from_lon},
-        "to": {"lat": to_lat, "lon": to_lon},
-        "date": departure_time.strftime("%Y-%m-%d"),
-        "time": departure_time.strftime("%H:%M:%S"),
-        "mode": "CAR" if mode == "AUTO" else "TRANSIT"
-    }
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'OTPTimeout': '180000'
-    }
-    
-    try:
-        response = requests.post(OTP_URL, json={"query": query, "variables": variables}, headers=headers)
-        
-        if response.status_code != 200:
-            print(f"Error response (status {response.status_code}): {response.text}")
-            return None
-
-        data = response.json()
-        if 'data' in data and 'plan' in data['data'] and data['data']['plan']['itineraries']:
-            return data['data']['plan']['itineraries'][0]['duration'] / 60  # Convert seconds to minutes
-        else:
-            return None
-    except Exception as e:
-        print(f"Exception occurred: {str(e)}")
-    
-    return None
+    Yield (zone_id, travel_time, attempts) for every zone, in completion order.
 
+    Zones are queried in rounds: every zone first tries its best candidate
+    point, packed engine.batch_size plans per request. A zone where OTP found
+    no route moves on to its next candidate point in the following round; a
+    zone whose request failed transiently (OTP busy or down) retries the same
+    point, up to MAX_TRANSIENT_ROUNDS times, instead of burning candidates.
+    Finished zones are recorded in engine.metrics, if the engine has one.
+    """
+    candidates = {taz: zone_points.candidates(taz)[:MAX_ATTEMPTS] for taz in zone_ids}
+    attempt = {taz: 0 for taz in zone_ids}
+    transient_rounds = {taz: 0 for taz in zone_ids}
+
+    def finish(taz, travel_time, attempts):
+        if engine.metrics is not None:
+            engine.metrics.record_zone(mode, direction, taz, travel_time, attempts)
+        return taz, travel_time, attempts
 
+    def query_batch(batch):
+        pairs = []
+        for taz in batch:
+            point_lat, point_lon = candidates[taz][attempt[taz]]
+            if direction == 'to':
+                pairs.append((point_lat, point_lon, focus_lat, focus_lon))
+            else:
+                pairs.append((focus_lat, focus_lon, point_lat, point_lon))
+        return engine.query_plans(pairs, mode, departure_time, direction)
 
-def generate_valid_point(geometry, max_attempts=50):
-    for _ in range(max_attempts):
-        minx, miny, maxx, maxy = geometry.bounds
-        point = shapely.geometry.Point(random.uniform(minx, maxx), random.uniform(miny, maxy))
-        if geometry.contains(point):
-            return point
-    return None
+    pending = list(zone_ids)
+    while pending:
+        for taz in pending:
+            if attempt[taz] >= len(candidates[taz]):
+                yield finish(taz, None, attempt[taz])
+        pending = [taz for taz in pending if attempt[taz] < len(candidates[taz])]
 
-def calculate_travel_times(focus_zone, zones, mode, direction, output_dir):
-    time_matrix = pd.DataFrame(columns=['TAZ_1270', 'TravelTime'])
+        batches = [pending[i:i + engine.batch_size] for i in range(0, len(pending), engine.batch_size)]
+        pending = []
+        for batch, (outcomes, travel_times) in engine.map_unordered(query_batch, batches):
+            for taz, outcome, travel_time in zip(batch, outcomes, travel_times):
+                if outcome == OK:
+                    yield finish(taz, travel_time, attempt[taz] + 1)
+                elif outcome == NO_ROUTE:
+                    attempt[taz] += 1
+                    pending.append(taz)
+                elif outcome == TRANSIENT and transient_rounds[taz] < MAX_TRANSIENT_ROUNDS:
+                    transient_rounds[taz] += 1
+                    pending.append(taz)
+                else:
+                    print(f"Giving up on zone {taz}: OTP request {outcome}")
+                    yield finish(taz, None, attempt[taz] + 1)
+
+def get_focus_point(zone_points, focus_zone):
+    if focus_zone not in zone_points:
+        raise KeyError(f"Focus zone {focus_zone} not found in TAZ_1270 column.")
+
+    return zone_points.first(focus_zone)
+
+def calculate_travel_times(focus_zone, zones, mode, direction, output_dir, engine=None, zone_points=None,
+                           service_date=None):
     total = len(zones)
     count = 0
     valid_count = 0
     # For trips to the focus zone, we analyze departure time at 7:30
     # For trip from the focus zone, we analyze departure time at 17:00
+    service_date = service_date or datetime.now().date()
     if direction == 'to':
-        departure_time = datetime.now().replace(hour=7, minute=30, second=0, microsecond=0)
+        departure_time = datetime.combine(service_date, datetime.min.time()).replace(hour=7, minute=30)
     else:
-        departure_time = datetime.now().replace(hour=17, minute=0, second=0, microsecond=0)
-    
-    focus_zone_row = zones[zones['TAZ_1270'] == focus_zone]
-    if focus_zone_row.empty:
-        raise KeyError(f"Focus zone {focus_zone} not found in TAZ_1270 column.")
-    
-    focus_lat, focus_lon = focus_zone_row.iloc[0].geometry.centroid.y, focus_zone_row.iloc[0].geometry.centroid.x
-    
-    for _, zone in zones.iterrows():
-        travel_time = None
-        attempts = 0
-        zone_points = [zone.geometry.centroid]
-        
-        while travel_time is None and attempts < 10:
-            if attempts >= len(zone_points):
-                new_point = generate_valid_point(zone.geometry)
-                if new_point:
-                    zone_points.append(new_point)
-                else:
-                    print(f"Failed to generate new point for zone {zone['TAZ_1270']} after multiple attempts")
-                    break
-            
-            current_point = zone_points[attempts]
-            if direction == 'to':
-                from_lat, from_lon = current_point.y, current_point.x
-                to_lat, to_lon = focus_lat, focus_lon
-            else:
-                from_lat, from_lon = focus_lat, focus_lon
-                to_lat, to_lon = current_point.y, current_point.x
-            
-            travel_time = get_travel_time(from_lat, from_lon, to_lat, to_lon, mode, departure_time)
-            attempts += 1
-        
-        if travel_time is not None:
-            new_row = pd.DataFrame({'TAZ_1270': [zone['TAZ_1270']], 'TravelTime': [travel_time]})
-            time_matrix = pd.concat([time_matrix, new_row], ignore_index=True, axis=0)
-            valid_count += 1
-        else:
-            print(f"No valid travel time found for zone {zone['TAZ_1270']} after {attempts} attempts.")
-        
-        count += 1
-        if count % 100 == 0:
-            print(f"Processed {count}/{total} destinations, {valid_count} valid times")
-        time.sleep(0.1)  # To avoid overwhelming the API
+        departure_time = datetime.combine(service_date, datetime.min.time()).replace(hour=17, minute=0)
     
-    print(f"Total valid travel times: {valid_count}/{total}")
-    
-    # Save the results
+    if zone_points is None:
+        zone_points = build_zone_points(zones, seed=POINT_SEED)
+    focus_lat, focus_lon = get_focus_point(zone_points, focus_zone)
+
+    owns_engine = engine is None
+    if owns_engine:
+        engine = OTPQueryEngine()
+
+    # Results are streamed to disk as they complete, so a partial file is usable during the run
     filename = f"{focus_zone}_{direction}_{mode}_travel_times.csv"
     filepath = os.path.join(output_dir, filename)
-    time_matrix.to_csv(filepath, index=False)
+
+    # Zones are queried concurrently and results stream back as they complete
+    try:
+        with TravelTimeWriter(filepath) as writer:
+            for taz, travel_time, attempts in query_zones(engine, zone_points, zones['TAZ_1270'],
+                                                          focus_lat, focus_lon, mode, direction, departure_time):
+                if travel_time is not None:
+                    writer.write(taz, travel_time, attempts, attempts - 1)
+                    valid_count += 1
+                else:
+                    writer.write(taz, None, attempts, -1)
+                    print(f"No valid travel time found for zone {taz} after {attempts} attempts.")
+
+                count += 1
+                if count % 100 == 0:
+                    print(f"Processed {count}/{total} destinations, {valid_count} valid times")
+    finally:
+        if owns_engine:
+            engine.close()
+
+    print(f"Total valid travel times: {valid_count}/{total}")
     print(f"Travel times saved to {filepath}")
-    
+
+    # Return the results in the shapefile's zone order regardless of completion order
+    time_matrix = read_travel_times(filepath)
+    zone_order = pd.Series(range(total), index=zones['TAZ_1270'].to_numpy())
+    time_matrix = time_matrix.sort_values('TAZ_1270', key=lambda taz: taz.map(zone_order), ignore_index=True)
+
     return time_matrix
 
+def departure_window(service_date, start, end, step_minutes):
+    """Return the departure times from start to end (HH:MM, inclusive) every step_minutes on service_date."""
+    current = datetime.strptime(f"{service_date} {start}", "%Y-%m-%d %H:%M")
+    last = datetime.strptime(f"{service_date} {end}", "%Y-%m-%d %H:%M")
+    departures = []
+    while current <= last:
+        departures.append(current)
+        current += timedelta(minutes=step_minutes)
+    return departures
 
-# Ask user for input
-# Beer Sheva Innovation District focus zone input is 101104
-while True:
-    user_input = input("Please enter the focus zone ID: ")
-    try:
-        focus_zone = int(user_input)
-        if focus_zone in zones['TAZ_1270'].values:
-            break
-        else:
-            print(f"Zone {focus_zone} not found in the TAZ_1270 column. Please try again.")
-    except ValueError:
-        print("Please enter a valid integer for the zone ID.")
+def calculate_travel_time_profiles(focus_zone, zones, mode, direction, output_dir, engine, zone_points,
+                                   departures, percentiles=SWEEP_PERCENTILES):
+    """
+    Calculate travel times for every departure time in departures and
+    summarise each zone's profile as min, median and percentile travel times.
+
+    Every departure goes through query_zones, so the sweep uses the same
+    concurrent, batched and cached requests as a single snapshot. The
+    summary is saved as <focus>_<direction>_<mode>_travel_time_profile.csv and
+    the full zone x departure array as a matching .npz.
+    """
+    zone_ids = zones['TAZ_1270'].to_numpy()
+    row_of = {taz: i for i, taz in enumerate(zone_ids)}
+    focus_lat, focus_lon = get_focus_point(zone_points, focus_zone)
+
+    profile = np.full((len(zone_ids), len(departures)), np.nan, dtype=np.float32)
+    for column, departure_time in enumerate(departures):
+        for taz, travel_time, _ in query_zones(engine, zone_points, zone_ids, focus_lat, focus_lon,
+                                               mode, direction, departure_time):
+            if travel_time is not None:
+                profile[row_of[taz], column] = travel_time
+        print(f"{mode} {direction} {departure_time:%H:%M}: "
+              f"{np.count_nonzero(~np.isnan(profile[:, column]))}/{len(zone_ids)} valid times")
+
+    valid = ~np.isnan(profile)
+    has_route = valid.any(axis=1)
+    summary = pd.DataFrame({'TAZ_1270': zone_ids, 'ValidDepartures': valid.sum(axis=1)})
+    summary['MinTravelTime'] = np.nan
+    summary['MedianTravelTime'] = np.nan
+    summary.loc[has_route, 'MinTravelTime'] = np.nanmin(profile[has_route], axis=1)
+    summary.loc[has_route, 'MedianTravelTime'] = np.nanmedian(profile[has_route], axis=1)
+    for percentile in percentiles:
+        summary[f'P{percentile}TravelTime'] = np.nan
+        summary.loc[has_route, f'P{percentile}TravelTime'] = np.nanpercentile(profile[has_route], percentile, axis=1)
+    summary = summary[has_route].reset_index(drop=True)
 
-print(f"Using focus zone: {focus_zone}")
+    basename = f"{focus_zone}_{direction}_{mode}_travel_time_profile"
+    filepath = os.path.join(output_dir, f"{basename}.csv")
+    summary.to_csv(filepath, index=False)
+    np.savez_compressed(os.path.join(output_dir, f"{basename}.npz"), travel_time=profile, zones=zone_ids,
+                        departures=np.array([d.strftime("%Y-%m-%dT%H:%M") for d in departures]))
+    print(f"Travel time profiles saved to {filepath}")
+
+    return summary
+
+def od_matrix_basename(mode, departure_time, graph_version):
+    """od_matrix_<mode>_<YYYYMMDD>T<HHMM>_<graph version>, so runs with other inputs never share files."""
+    return f"od_matrix_{mode}_{departure_time:%Y%m%dT%H%M}_{graph_version[:12]}"
+
+def calculate_od_matrix(zones, mode, departure_time, output_dir, engine, zone_points, origins=None,
+                        graph_version=GRAPH_VERSION):
+    """
+    Calculate travel times from every origin zone to every zone in zones.
 
-# The rest of your code follows...
-output_dir = "/Users/noamgal/Downloads/NUR/celular1819_v1.3"
+    Each completed origin row is checkpointed to its own .npy file, so an
+    interrupted run resumes from the first unfinished origin. The checkpoint
+    folder and the output are named by mode, departure time and graph version
+    (see od_matrix_basename), so a run with another date, time or feed starts
+    from scratch instead of reusing old rows. The finished matrix is written as
+    <basename>.npz with the travel times in minutes (float32, NaN where no
+    route was found), the origin and destination TAZ_1270 ids, the departure
+    time and the graph version.
+    """
+    destinations = zones['TAZ_1270'].to_numpy()
+    origins = destinations if origins is None else np.asarray(origins)
+    column_of = {taz: i for i, taz in enumerate(destinations)}
+
+    basename = od_matrix_basename(mode, departure_time, graph_version)
+    checkpoint_dir = os.path.join(output_dir, f"{basename}_checkpoint")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    for row_number, origin in enumerate(origins, start=1):
+        row_path = os.path.join(checkpoint_dir, f"{origin}.npy")
+        if os.path.exists(row_path):
+            continue
+
+        origin_lat, origin_lon = get_focus_point(zone_points, origin)
+        row = np.full(len(destinations), np.nan, dtype=np.float32)
+        for taz, travel_time, _ in query_zones(engine, zone_points, destinations,
+                                               origin_lat, origin_lon, mode, 'from', departure_time):
+            if travel_time is not None:
+                row[column_of[taz]] = travel_time
+
+        # Write then rename so a crash never leaves a partial row behind
+        temp_path = os.path.join(checkpoint_dir, f"{origin}.tmp.npy")
+        np.save(temp_path, row)
+        os.replace(temp_path, row_path)
+        rate = f", {engine.metrics.requests_per_second():.1f} requests/s" if engine.metrics is not None else ""
+        print(f"{mode}: origin {origin} done ({row_number}/{len(origins)}), "
+              f"{np.count_nonzero(~np.isnan(row))}/{len(destinations)} valid times{rate}")
+
+    matrix = np.stack([np.load(os.path.join(checkpoint_dir, f"{origin}.npy")) for origin in origins])
+    filepath = os.path.join(output_dir, f"{basename}.npz")
+    np.savez_compressed(filepath, travel_time=matrix, origins=origins, destinations=destinations,
+                        departure_time=departure_time.strftime("%Y-%m-%dT%H:%M"), graph_version=graph_version)
+    print(f"OD matrix saved to {filepath}")
+
+    return matrix
+
+
+def ask_focus_zone(zones):
+    # Beer Sheva Innovation District focus zone input is 101104
+    while True:
+        user_input = input("Please enter the focus zone ID: ")
+        try:
+            focus_zone = int(user_input)
+            if focus_zone in zones['TAZ_1270'].values:
+                return focus_zone
+            else:
+                print(f"Zone {focus_zone} not found in the TAZ_1270 column. Please try again.")
+        except ValueError:
+            print("Please enter a valid integer for the zone ID.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Calculate OTP travel times between TAZ_1270 zones.")
+    parser.add_argument('--batch', action='store_true',
+                        help="compute the full OD matrix instead of asking for a focus zone")
+    parser.add_argument('--origins', help="text file with one origin TAZ_1270 id per line (default: all zones)")
+    parser.add_argument('--modes', nargs='+', default=['AUTO', 'TRANSIT'], choices=['AUTO', 'TRANSIT'])
+    parser.add_argument('--focus-zone', type=int, help="focus zone id (default: ask for it)")
+    parser.add_argument('--date', default=datetime.now().strftime("%Y-%m-%d"), help="service date, YYYY-MM-DD")
+    parser.add_argument('--time', default="07:30", help="departure time for the batch matrix, HH:MM")
+    parser.add_argument('--sweep', action='store_true',
+                        help="query a window of departure times per direction and save travel time profiles")
+    parser.add_argument('--window-to', nargs=2, default=SWEEP_WINDOWS['to'], metavar=('START', 'END'),
+                        help="departure window for trips to the focus zone, HH:MM HH:MM")
+    parser.add_argument('--window-from', nargs=2, default=SWEEP_WINDOWS['from'], metavar=('START', 'END'),
+                        help="departure window for trips from the focus zone, HH:MM HH:MM")
+    parser.add_argument('--step', type=int, default=SWEEP_STEP_MINUTES, help="minutes between swept departures")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--otp-url', nargs='+', default=[OTP_URL],
+                        help="one or more OTP GraphQL endpoints to share the requests across")
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="plan queries packed into one OTP request")
+    parser.add_argument('--feed-manifest',
+                        help="gtfs_manifest.json (or GTFS directory) of the feed the OTP graph was built from; "
+                             "its feed version replaces GRAPH_VERSION as the cache key")
+    parser.add_argument('--otp-timeout', type=float, default=OTP_TIMEOUT,
+                        help="seconds OTP may spend on one request before it counts as failed")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # Load TAZ zones shapefile
+    zones = gpd.read_file(ZONES_PATH)
+    zones = zones.to_crs(epsg=4326)
+
+    output_dir = args.output_dir
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    zone_points = load_zone_points(zones, output_dir, MAX_ATTEMPTS, POINT_SEED)
+
+    cache_path = os.path.join(output_dir, CACHE_FILENAME)
+    metrics_path = os.path.join(output_dir, METRICS_FILENAME)
+    graph_version = feed_version(args.feed_manifest) if args.feed_manifest else GRAPH_VERSION
+    with TravelTimeCache(cache_path, version=graph_version) as cache, RunMetrics(metrics_path) as metrics, \
+            OTPQueryEngine(args.otp_url, max_in_flight=args.max_in_flight, cache=cache, metrics=metrics,
+                           batch_size=args.batch_size, timeout=args.otp_timeout) as engine:
+        if args.batch:
+            origins = None
+            if args.origins:
+                with open(args.origins) as f:
+                    origins = [int(line) for line in f if line.strip()]
+                missing = set(origins) - set(zones['TAZ_1270'])
+                if missing:
+                    raise KeyError(f"Origin zones not found in TAZ_1270 column: {sorted(missing)}")
+
+            departure_time = datetime.strptime(f"{args.date} {args.time}", "%Y-%m-%d %H:%M")
+            for mode in args.modes:
+                print(f"Calculating {mode} OD matrix departing {departure_time}...")
+                calculate_od_matrix(zones, mode, departure_time, output_dir, engine, zone_points, origins,
+                                    graph_version)
+        else:
+            focus_zone = args.focus_zone if args.focus_zone is not None else ask_focus_zone(zones)
+            print(f"Using focus zone: {focus_zone}")
+            service_date = datetime.strptime(args.date, "%Y-%m-%d").date()
+            windows = {'to': args.window_to, 'from': args.window_from}
 
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
+            for direction in ['to', 'from']:
+                print(f"Calculating travel times {direction} focus zone {focus_zone}...")
+                for mode in args.modes:
+                    if args.sweep:
+                        departures = departure_window(args.date, *windows[direction], args.step)
+                        calculate_travel_time_profiles(focus_zone, zones, mode, direction, output_dir,
+                                                       engine, zone_points, departures)
+                    else:
+                        calculate_travel_times(focus_zone, zones, mode, direction, output_dir,
+                                               engine, zone_points, service_date)
 
-print(f"Calculating travel times to focus zone {focus_zone}...")
-calculate_travel_times(focus_zone, zones, "AUTO", "to", output_dir)
-calculate_travel_times(focus_zone, zones, "TRANSIT", "to", output_dir)
+        metrics.print_summary(args.max_in_flight)
+        print(f"Request log written to {metrics_path}")
 
-print(f"Calculating travel times from focus zone {focus_zone}...")
-calculate_travel_times(focus_zone, zones, "AUTO", "from", output_dir)
-calculate_travel_times(focus_zone, zones, "TRANSIT", "from", output_dir)
+    print("All calculations complete.")
 
-print("All calculations complete.")
+if __name__ == "__main__":
+    main()
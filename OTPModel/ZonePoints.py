@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Candidate query points for every TAZ polygon.
+
+OTP cannot route from every coordinate (e.g. a centroid in a field far from a
+road), so each zone gets a short ordered list of points inside it to try in
+turn: the centroid when it falls inside the zone, the shapely
+representative_point, and then random samples. Samples are drawn with a seed
+derived from the zone id, so the table is reproducible, and it is cached to an
+.npz file so every OTP run reuses the same points.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import shapely
+
+# Default number of candidate points per zone, matching the 10 attempts TravelTimes makes per zone
+DEFAULT_K = 10
+
+
+class ZonePoints:
+    """Table of K candidate (lat, lon) points per TAZ_1270 zone, in EPSG:4326."""
+
+    def __init__(self, taz, lat, lon):
+        self.taz = np.asarray(taz)
+        self.lat = np.asarray(lat)
+        self.lon = np.asarray(lon)
+        self._row = {taz_id: i for i, taz_id in enumerate(self.taz.tolist())}
+
+    def __contains__(self, taz):
+        return taz in self._row
+
+    def candidates(self, taz):
+        """Return the list of (lat, lon) candidate points for a zone, best first."""
+        row = self._row[taz]
+        valid = ~np.isnan(self.lat[row])
+        return list(zip(self.lat[row][valid].tolist(), self.lon[row][valid].tolist()))
+
+    def first(self, taz):
+        """Return the preferred (lat, lon) point of a zone."""
+        row = self._row[taz]
+        return self.lat[row, 0], self.lon[row, 0]
+
+    def save(self, path, geometry_hash):
+        np.savez(path, taz=self.taz, lat=self.lat, lon=self.lon, geometry_hash=geometry_hash)
+
+
+def sample_points(geometry, count, rng, max_batches=20):
+    """Draw up to count uniform random points inside geometry, vectorized with contains_xy."""
+    shapely.prepare(geometry)
+    minx, miny, maxx, maxy = geometry.bounds
+    # Oversample by the inverse of the polygon's share of its bounding box
+    box_area = (maxx - minx) * (maxy - miny)
+    fill = geometry.area / box_area if box_area > 0 else 1.0
+    batch = int(np.ceil(2 * count / max(fill, 0.01)))
+
+    xs, ys = [], []
+    found = 0
+    for _ in range(max_batches):
+        x = rng.uniform(minx, maxx, batch)
+        y = rng.uniform(miny, maxy, batch)
+        inside = shapely.contains_xy(geometry, x, y)
+        xs.append(x[inside])
+        ys.append(y[inside])
+        found += int(inside.sum())
+        if found >= count:
+            break
+
+    return np.concatenate(xs)[:count], np.concatenate(ys)[:count]
+
+
+def build_zone_points(zones, k=DEFAULT_K, seed=0):
+    """Build the candidate point table for a GeoDataFrame of zones in EPSG:4326."""
+    n = len(zones)
+    lat = np.full((n, k), np.nan)
+    lon = np.full((n, k), np.nan)
+
+    for i, (taz, geometry) in enumerate(zip(zones['TAZ_1270'], zones.geometry)):
+        points = []
+        centroid = geometry.centroid
+        if geometry.contains(centroid):
+            points.append((centroid.x, centroid.y))
+        representative = geometry.representative_point()
+        points.append((representative.x, representative.y))
+
+        rng = np.random.default_rng([seed, int(taz)])
+        xs, ys = sample_points(geometry, k - len(points), rng)
+        points.extend(zip(xs.tolist(), ys.tolist()))
+
+        points = points[:k]
+        lon[i, :len(points)] = [x for x, _ in points]
+        lat[i, :len(points)] = [y for _, y in points]
+
+    return ZonePoints(zones['TAZ_1270'].to_numpy(), lat, lon)
+
+
+def geometry_hash(zones):
+    """Hash of the zone ids and geometries, used to detect a stale cached table."""
+    digest = hashlib.sha1()
+    digest.update(zones['TAZ_1270'].to_numpy().astype(np.int64).tobytes())
+    for wkb in shapely.to_wkb(zones.geometry.to_numpy()):
+        digest.update(wkb)
+    return digest.hexdigest()
+
+
+def load_zone_points(zones, cache_dir, k=DEFAULT_K, seed=0):
+    """Load the cached candidate table for zones, building and caching it if needed."""
+    path = os.path.join(cache_dir, f"zone_points_k{k}_seed{seed}.npz")
+    zones_hash = geometry_hash(zones)
+
+    if os.path.exists(path):
+        cached = np.load(path)
+        if str(cached['geometry_hash']) == zones_hash:
+            return ZonePoints(cached['taz'], cached['lat'], cached['lon'])
+        print(f"Zone geometries changed, rebuilding {path}")
+
+    table = build_zone_points(zones, k, seed)
+    table.save(path, zones_hash)
+    print(f"Zone candidate points saved to {path}")
+    return table
@@ -17,6 +17,12 @@ from branca.colormap import LinearColormap
 from folium.plugins import MarkerCluster
 import contextily as ctx
 from matplotlib_scalebar.scalebar import ScaleBar
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from TripTables import load_trip_table
+from ODTensor import load_od_tensor
 
 print('imports completed')
 
@@ -24,8 +30,9 @@ print('imports completed')
 zones = gpd.read_file('/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp').to_crs(epsg=3857)
 large_zones = gpd.read_file('/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/33_02.09.2021.shp').to_crs(epsg=3857)
 population_df = pd.read_excel('/Users/noamgal/Downloads/NUR/celular1819_v1.3/1270_population.xlsx')
-df_weekday = pd.read_csv('/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_v1.csv')
-df_weekday_arrival = pd.read_csv('/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHourlyTrips201819_1270_weekday_arrival_v1.2.csv')
+df_weekday = load_trip_table('hourly')
+df_weekday_arrival = load_trip_table('hourly_arrival')
+od_weekday = load_od_tensor('hourly')
 
 print('datasets loaded')
 
@@ -37,7 +44,7 @@ def generate_maps_and_graphs(focus_zone):
     mean_population = population[population > 0].mean()
     population = population.replace(0, mean_population)
     
-    trips_to_focus = df_weekday[df_weekday['ToZone'] == focus_zone].groupby('fromZone')[['h' + str(i) for i in range(24)]].sum().sum(axis=1)
+    trips_to_focus = od_weekday.totals_to(focus_zone)
     
     # Merge population and trip data with zones
     zones_data = zones.merge(
@@ -525,7 +532,7 @@ def generate_filtered_map(focus_zone):
     mean_population = population[population > 0].mean()
     population = population.replace(0, mean_population)
     
-    trips_to_focus = df_weekday[df_weekday['ToZone'] == focus_zone].groupby('fromZone')[['h' + str(i) for i in range(24)]].sum().sum(axis=1)
+    trips_to_focus = od_weekday.totals_to(focus_zone)
     
     # Merge population and trip data with zones
     zones_data = zones.merge(
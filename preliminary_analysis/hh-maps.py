@@ -6,7 +6,6 @@ Created on Sun Aug 25 12:26:37 2024
 @author: noamgal
 """
 
-import pandas as pd
 import geopandas as gpd
 from branca.colormap import LinearColormap
 import pyproj
@@ -15,13 +14,16 @@ from folium.plugins import MarkerCluster
 
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from TripTables import load_trip_table
 
 # Read in Shape of Zones
 zones_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp'
 zones = gpd.read_file(zones_path)
 
-half_hour_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHalfHour6_20Trips201819_1270_weekday_v1.2.csv'
-trip_data = pd.read_csv(half_hour_path)
+trip_data = load_trip_table('half_hourly')
 
 # Request focus zone input from user
 focus_zone = int(input("Please enter the focus zone ID: "))
@@ -13,16 +13,20 @@ Created on Sun Jul  7 22:51:38 2024
 
 @author: noamgal
 """
-import pandas as pd
 import geopandas as gpd
 from branca.colormap import LinearColormap
 import pyproj
 import folium
 from folium.plugins import MarkerCluster
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DataStore'))
+from SparseOD import load_sparse_od
 
 # Loads and reads the Half Hour Trip Data
-half_hour_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/AvgDayHalfHour6_20Trips201819_1270_weekday_v1.2.csv'
-travel_hh = pd.read_csv(half_hour_path)
+# Only the zone pairs with trips, indexed by origin and by destination
+od_hh = load_sparse_od('half_hourly')
 
 # Shapefile Paths
 zones_path = '/Users/noamgal/Downloads/NUR/celular1819_v1.3/Shape_files/1270_02.09.2021.shp'
@@ -32,22 +36,11 @@ zones = gpd.read_file(zones_path)
 # Request focus zone input from user
 focus_zone = int(input("Please enter the focus zone ID: "))
 
-# Create to_focus DataFrame
-to_focus = travel_hh[travel_hh['ToZone'] == focus_zone].copy()
-
-# Create from_focus DataFrame
-from_focus = travel_hh[travel_hh['fromZone'] == focus_zone].copy()
-
-# Sum across all hour columns for to_focus
-hour_columns = [col for col in to_focus.columns if col.startswith('h')]
-to_focus_totals = to_focus.groupby('fromZone')[hour_columns].sum().sum(axis=1).reset_index()
-to_focus_totals.columns = ['fromZone', 'TotalTrips']
-to_focus_totals = to_focus_totals.sort_values('TotalTrips', ascending=False)
+# Total trips to the focus zone per origin, largest first
+to_focus_totals = od_hh.top_origins(focus_zone).rename('TotalTrips').reset_index()
 
-# Sum across all hour columns for from_focus
-from_focus_totals = from_focus.groupby('ToZone')[hour_columns].sum().sum(axis=1).reset_index()
-from_focus_totals.columns = ['ToZone', 'TotalTrips']
-from_focus_totals = from_focus_totals.sort_values('TotalTrips', ascending=False)
+# Total trips from the focus zone per destination, largest first
+from_focus_totals = od_hh.top_destinations(focus_zone).rename('TotalTrips').reset_index()
 
 def create_interactive_map(zones, trip_data, focus_zone_id, direction='to'):
     # Determine the correct column names based on direction